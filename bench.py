@@ -0,0 +1,173 @@
+#!/usr/bin/env python2
+
+"""
+Optiness brain benchmarks
+
+Runs each brain on a fixed set of scenarios, headless and under node and
+time budgets, and records how fast it searched (nodes/sec), what it found
+and how much memory it took into a JSON file.  Given an earlier such file
+as a baseline, reports the runs that got worse.
+"""
+
+import sys, os, getopt, time, glob
+import json, resource, multiprocessing
+
+# the sweep already knows how to run one game x brain combination in a worker
+import sweep
+
+# the fixed scenarios, given like sweep.py's games
+scenarios = ['maze@seed:1|2|3@screen:(40,30)|(100,80)',
+             "maze@seed:1|2|3@screen:(400,300)@heuristic:'exact'"] + \
+            ['sokoban@map:{!r}'.format(i) for i in sorted(glob.glob('data/*.txt'))] + \
+            ['sokoban@map:{!r}@pushes:1'.format(i) for i in sorted(glob.glob('data/*.txt'))] + \
+            ["sokoban@map:'data/optiness.xsb'@level:2..3@pushes:0|1"] + \
+            ['brainfuck@output:{!r}'.format(i) for i in ['\x02', 'hi', 'foo']] + \
+            ['brainfuck@output:{!r}@prune:1'.format(i) for i in ['\x02', 'hi', 'foo']] + \
+            ['brainfuck@targets:{!r}@prune:0|1'.format(['\x03\x03', '\x03\x03\x01', '\x03\x03\x02', '\x03\x03\x04'])]
+brains = ['sagan', 'inception', 'wario', 'waluigi', 'dawkins']
+
+jobs = 1                          # worker processes.  more than one muddies the timings
+timelimit = 30.0                  # seconds each run may take
+nodelimit = 200000                # nodes (states searched) each run may search
+tolerance = 0.1                   # fraction nodes/sec and memory may get worse by unflagged
+output = 'output/bench.json'      # default value for the results file
+baseline = None                   # results file to compare against
+
+columns = ['solved', 'pathlen', 'time', 'nodes', 'nodes_per_sec', 'maxrss_kb', 'error']
+
+
+
+def usage():
+	return """
+usage: bench.py [options]
+
+runs every brain on every scenario:
+  {}
+
+options:
+  -b, --brain NAME     only run this brain (may be given more than once)
+  -s, --scenario STR   only run scenarios containing STR (may be given more than once)
+  -j, --jobs N         number of worker processes ({})
+  -t, --time SEC       time budget for each run ({})
+  -n, --nodes N        node budget for each run ({})
+  -o, --output FILE    where to write the results ({})
+  -c, --compare FILE   report regressions against the results in FILE
+  -T, --tolerance F    how much worse nodes/sec and memory may get, as a fraction ({})
+""".format('\n  '.join(scenarios), jobs, timelimit, nodelimit, output, tolerance)
+
+
+# 'maze@seed:1' etc. for each game the scenarios expand to
+def ListScenarios(filters=[]):
+	for spec in scenarios:
+		for name, args in sweep.ExpandSpec(spec):
+			scenario = '@'.join([name] + ['{}:{}'.format(k, v) for k, v in sorted(args.items())])
+			if filters and not any(f in scenario for f in filters):  continue
+			yield (scenario, name, args)
+
+
+# runs in a worker process of its own, so the memory it reports is just this run's
+def RunBench(job):
+	scenario, name, args, brain, timelimit, nodelimit = job
+	row = sweep.RunJob((scenario, (name, args, brain, {}), timelimit, nodelimit, None, True))
+	row = dict((i, row.get(i)) for i in columns)
+	row.update({ 'scenario': scenario, 'brain': brain })
+	if row['nodes'] and row['time']:
+		row['nodes_per_sec'] = row['nodes'] / row['time']
+	# kilobytes on linux
+	row['maxrss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	return row
+
+
+def RunBenchmarks(work, jobs=1):
+	print 'Bench:', len(work), 'runs on', jobs, 'processes'
+	pool = multiprocessing.Pool(jobs, maxtasksperchild=1)
+	rows = []
+	start = time.time()
+	try:
+		for row in pool.imap(RunBench, work):
+			rows.append(row)
+			print 'Bench: {:50} {:10} {:>5} {:>8} nodes/s  ({:.0f}s elapsed)'.format(row['scenario'],
+				row['brain'], 'ok' if row['solved'] else '-', int(row['nodes_per_sec'] or 0), time.time() - start)
+	finally:
+		pool.terminate()
+	return rows
+
+
+# a list of what got worse in each run that's in both sets of results
+def Regressions(results, base, tolerance):
+	old = dict(((i['scenario'], i['brain']), i) for i in base['results'])
+	found = []
+	for new in results['results']:
+		key = (new['scenario'], new['brain'])
+		if key not in old:  continue
+		was = old[key]
+		problems = []
+		if new['error'] and not was['error']:
+			problems.append('error: ' + new['error'])
+		if was['solved'] and not new['solved']:
+			problems.append('no longer solved')
+		elif was['solved'] and new['pathlen'] > was['pathlen']:
+			problems.append('path {} -> {}'.format(was['pathlen'], new['pathlen']))
+		if was['nodes_per_sec'] and (new['nodes_per_sec'] or 0) < was['nodes_per_sec'] * (1 - tolerance):
+			problems.append('nodes/sec {:.0f} -> {:.0f}'.format(was['nodes_per_sec'], new['nodes_per_sec'] or 0))
+		if was['maxrss_kb'] and new['maxrss_kb'] > was['maxrss_kb'] * (1 + tolerance):
+			problems.append('memory {}K -> {}K'.format(was['maxrss_kb'], new['maxrss_kb']))
+		if problems:
+			found.append((key, problems))
+	return found
+
+
+
+if __name__ == "__main__":
+	only_brains, only_scenarios = ([], [])
+
+	# parse command line arguments
+	try:
+		opts, args = getopt.getopt(sys.argv[1:], "hb:s:j:t:n:o:c:T:", ["help", "brain=", "scenario=", "jobs=", "time=",
+		                                                               "nodes=", "output=", "compare=", "tolerance="])
+
+		for o,a in opts:
+			if o in ('-h', '--help'):
+				print usage()
+				sys.exit(0)
+			elif o in ('-b', '--brain'):
+				only_brains.append(a)
+			elif o in ('-s', '--scenario'):
+				only_scenarios.append(a)
+			elif o in ('-j', '--jobs'):
+				jobs = int(a)
+			elif o in ('-t', '--time'):
+				timelimit = float(a)
+			elif o in ('-n', '--nodes'):
+				nodelimit = int(a)
+			elif o in ('-o', '--output'):
+				output = a
+			elif o in ('-c', '--compare'):
+				baseline = a
+			elif o in ('-T', '--tolerance'):
+				tolerance = float(a)
+	except getopt.GetoptError, err:
+		print str(err), usage()
+		sys.exit(2)
+
+	if baseline is not None:
+		base = json.load(open(baseline))
+
+	work = [(s, name, args, b, timelimit, nodelimit) for s, name, args in ListScenarios(only_scenarios)
+	                                                 for b in (only_brains or brains)]
+	results = { 'date':      time.asctime(),
+	            'timelimit': timelimit,
+	            'nodelimit': nodelimit,
+	            'results':   RunBenchmarks(work, jobs) }
+	json.dump(results, open(output, 'w'), indent=1, sort_keys=True)
+	print 'Bench: results written to', output
+
+	if baseline is not None:
+		if (base['timelimit'], base['nodelimit']) != (timelimit, nodelimit):
+			print 'Bench: warning: {} was run with different budgets'.format(baseline)
+		found = Regressions(results, base, tolerance)
+		for (scenario, brain), problems in found:
+			print 'Regression: {} {}: {}'.format(scenario, brain, ', '.join(problems))
+		print 'Bench: {} regressions against {}'.format(len(found), baseline)
+		if found:
+			sys.exit(1)
@@ -23,7 +23,9 @@ class Indiv:
 	def __init__(self, game, dnalen):
 		self.game = game
 		self.init_state = self.game.Freeze()
-		self.dna = [random.choice(self.game.ValidInputs()) for i in xrange(dnalen)]
+		# dna is always played from the start, so it's made of the inputs valid there
+		self.inputs = self.game.ValidInputs()
+		self.dna = [random.choice(self.inputs) for i in xrange(dnalen)]
 		self.dnalen = dnalen
 		self.fitness = float("inf")
 
@@ -52,7 +54,7 @@ class Indiv:
 		npoint = int(random.random()*strength*avg_point_mutations)
 		for n in xrange(npoint):
 			i = random.randint(0,dnalen-1)
-			self.dna[i] = random.choice(self.game.ValidInputs())
+			self.dna[i] = random.choice(self.inputs)
 
 		# perform swap mutations
 		nswap = int(random.random()*strength*avg_swaps)
@@ -74,7 +76,7 @@ class Indiv:
 				self.dna[i]=self.dna[i+1]
 
 			# add a random base at the end to maintain length
-			self.dna[j] = random.choice(self.game.ValidInputs())
+			self.dna[j] = random.choice(self.inputs)
 
 class Dawkins(Brain):
 	name = 'dawkins'
@@ -92,22 +94,27 @@ class Dawkins(Brain):
 		self.avg_deletions = self.args['avg_deletions']
 
 		self.pop = [Indiv(game, dnalen) for i in xrange(popsize)]
+		self.init_state = self.game.Freeze()
 		self.input_string = (float("inf"), []) # pair of (heur, path)
 
 	# we deviate a bit from the biblical record here
 	def Step(self):
-		# evaluate fitnesses
+		# evaluate fitnesses, the whole population at once
+		results = self.game.RunPopulation(self.init_state, [i.dna for i in self.pop])
 		print "(",
-		for i in self.pop:
-			win_steps = i.Run()
+		for i, (fitness, win_steps) in zip(self.pop, results):
+			i.fitness = fitness
 			if win_steps > -1:
 				if win_steps < self.input_string[0]:
 					self.input_string = (win_steps, i.dna)
 			print i.fitness,
-			yield self.game.Draw()
 		print ")"
 
 		self.pop.sort() # sort by fitness
+		self.Caption('best fitness {}'.format(self.pop[0].fitness))
+
+		# show it, and allow the program to be quit, once a generation
+		self.PollEvents()
 
 		# survival of the fittest and reproduction
 		for i in xrange(len(self.pop)/2):
@@ -122,7 +129,18 @@ class Dawkins(Brain):
 					  self.avg_swaps,
 					  self.avg_deletions )
 
-		yield self.game.Draw()
+		yield self.Draw()
+
+	# fitnesses are recomputed anyway, but they're cheap to keep
+	def Freeze(self):
+		return { 'pop':          [(i.dna[:], i.fitness) for i in self.pop],
+		         'input_string': self.input_string }
+
+	def Thaw(self, data):
+		for i, (dna, fitness) in zip(self.pop, data['pop']):
+			i.dna = dna
+			i.fitness = fitness
+		self.input_string = data['input_string']
 
 	def Path(self):
 		return self.input_string[1]
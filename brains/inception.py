@@ -25,25 +25,40 @@ class Inception(Brain):
 
 	def Step(self):
 		print 'DFS with max depth', self.maxdepth
-		sol = self._DFS(self.init_state)
+		self.game.Thaw(self.init_state)
+		sol = self._DFS()
 		if sol is not None:
 			self.input_log = sol
 		self.maxdepth += self.depthfactor
-		return (self.game.Draw(),)
+		return (self.Draw(),)
 
-	def _DFS(self, node, depth = 0):
+	# searches from wherever the game is, and leaves it there
+	def _DFS(self, depth = 0):
 		for i in self.game.ValidInputs():
-			self.game.Thaw(node)
-			self.game.Input(i)
-			if self.game.Victory() or self.terminated:
+			self.PollEvents()
+			self.game.Push(i)
+			found = self.game.Victory() or self.terminated
+			ret = None
+			if not found and depth < self.maxdepth:
+				ret = self._DFS(depth+1)
+			self.game.Pop()
+			if found:
 				return [i]
-			if depth < self.maxdepth:
-				ret = self._DFS(self.game.Freeze(), depth+1)
-				if ret is not None:
-					ret.insert(0, i)
-					return ret
+			if ret is not None:
+				ret.insert(0, i)
+				return ret
 		return None
 
+	# Step only ever yields between iterations, so this is all there is to it.  a search
+	# that's stopped partway through an iteration (say, by ctrl-c) starts that iteration
+	# over when it's resumed, so the last, biggest iteration's work so far is lost.
+	def Freeze(self):
+		return {'maxdepth': self.maxdepth, 'input_log': self.input_log}
+
+	def Thaw(self, data):
+		self.maxdepth = data['maxdepth']
+		self.input_log = data['input_log']
+
 	def Victory(self):
 		return (self.input_log is not None) or self.terminated
 
@@ -5,14 +5,15 @@ An Optiness "pathfinder" that plays back recorded input
 Darren Alton
 """
 
-import pygame, cPickle
+import pygame
 import os, wave
 from array import array
 
 from skeleton_solver import Brain
+import runfile
 
 defaultargs = { 'fps':         60, # run at 60fps because we have a human watching
-				'file':        'output/last_run.pickle',
+				'file':        'output/last_run.run',
 				'granularity': 1,  # mostly for converting SuperOpti runs to 60fps
 				'force':       False,
 				'recordvideo': False,
@@ -35,11 +36,12 @@ class Rerun(Brain):
 		self.recordvideo = self.args['recordvideo']
 		self.recordaudio = self.args['recordaudio']
 
-		loadedfile = cPickle.load(open(self.args['file'], 'r'))
+		# run files are read lazily, so long runs start playing right away
+		loadedfile = runfile.Load(self.args['file'])
 
 		if self.recordaudio:
 			# todo: some way to determine appropriate framerate from game.  currently using values for snes
-			self.wav = wave.open('output/{}_{}.wav'.format(self.__class__.name, self.game.__class__.name), 'wb')
+			self.wav = wave.open('output/{}_{}.wav'.format(self.__class__.name, self.game.name), 'wb')
 			self.wav.setnchannels(2)
 			self.wav.setsampwidth(2)
 			self.wav.setframerate(32040)
@@ -48,12 +50,15 @@ class Rerun(Brain):
 		print 'replaying a run of:\t', loadedfile['game'], '\t', loadedfile['game_args']
 		print 'that was produced by:\t', loadedfile['brain'], '\t', loadedfile['brain_args']
 		if not self.force:
-			if loadedfile['game'] != game.__class__.name:
+			if loadedfile['game'] != game.name:
 				raise Exception('loaded input string is for "%s"' % (loadedfile['game']))
 
 			special_cases = ['granularity', 'audio']
 			mismatches = []
 			for key in game.args:
+				if key in game.search_args:
+					# the file holds plain inputs however they were searched for
+					continue
 				if key not in special_cases:
 					# note: old args being dropped are implicitly ignored by this loop.
 					# explicitly ignore new features with this conditional.
@@ -77,6 +82,7 @@ class Rerun(Brain):
 				raise Exception('game_args mismatch')
 
 		self.inputstring = loadedfile['path']
+		self.cursor = 0
 		self.outputstring = []
 		print 'with', len(self.inputstring), 'frames of input'
 
@@ -84,17 +90,20 @@ class Rerun(Brain):
 		if self.fps > 0:  self.clock.tick(self.fps)
 		frameinput = 0
 
-		if len(self.inputstring):  frameinput = self.inputstring.pop(0)
+		if self.cursor < len(self.inputstring):
+			frameinput = self.inputstring[self.cursor]
+			self.cursor += 1
 
 		for i in xrange(self.granularity):
 			self.game.Input(frameinput)
 			self.outputstring.append(frameinput)
-			surf = self.game.Draw()
+			surf = self.Draw()
 
 			if self.recordvideo:
+				if surf is None:  surf = self.game.Draw()
 				pygame.image.save( surf,
 								   'output/%s_%s_%04d.png' % ( self.__class__.name,
-				                                               self.game.__class__.name,
+				                                               self.game.name,
 				                                               len(self.outputstring) ) )
 			if self.recordaudio:
 				self.wav.writeframesraw(array('H', self.game.Sound()).tostring())
@@ -108,6 +117,6 @@ class Rerun(Brain):
 		return self.outputstring
 
 	def Victory(self):
-		return len(self.inputstring) <= 0
+		return self.cursor >= len(self.inputstring)
 
 LoadedBrain = Rerun
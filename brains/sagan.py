@@ -13,11 +13,12 @@ from heapq import *
 defaultargs = { 'edgecost': 1 }
 
 class SaganNode:
-	def __init__(self, game, edge, parent=None, input=None):
-		self.state = game.Freeze()
+	def __init__(self, key, state, h, victory, edge=0, parent=None, input=None):
+		self.key = key # the game's StateKey, which is what we compare nodes by
+		self.state = state
 		self.g = 0
-		self.h = game.Heuristic()
-		self.victory = game.Victory()
+		self.h = h
+		self.victory = victory
 		if parent is not None:  parent.Adopt(self, input, edge)
 		else:  self.parent = None
 
@@ -30,11 +31,14 @@ class SaganNode:
 		# this is a function so we can deal with making a disk cache
 		return self.state
 
+	# walks up rather than recursing, since long paths would hit the recursion limit
 	def ReconstructPath(self):
-		if self.parent is None:  return []
-		# "else"
-		p = self.parent.ReconstructPath()
-		p.append(self.input)
+		p = []
+		node = self
+		while node.parent is not None:
+			p.append(node.input)
+			node = node.parent
+		p.reverse()
 		return p
 
 	def f(self):
@@ -43,9 +47,9 @@ class SaganNode:
 	def Victory(self):
 		return self.victory
 
-	def __le__(self, other):  return self.f() <= other.f()
-	def __eq__(self, other):  return self.GetState() == other.GetState()
-	def __hash__(self):       return hash(self.GetState())
+	# among equally good nodes, prefer the one closer to the goal.  with an exact
+	# heuristic, that means only the nodes on one shortest path get expanded.
+	def __le__(self, other):  return (self.f(), self.h) <= (other.f(), other.h)
 
 class Sagan(Brain):
 	name = 'sagan'
@@ -53,35 +57,103 @@ class Sagan(Brain):
 		Brain.__init__(self, game, args, defaultargs)
 		self.edge = self.args['edgecost']
 		self.input_log = None
+		self.openset = None  # minheap of nodes, possibly with some stale ones (see openkeys)
+		self.openkeys = None # state key -> the best node for that state in the open set
+		self.closedset = None # state keys
+		self.current = None # the node whose children we're in the middle of looking at
+
+	def _Node(self, state, h, victory, parent=None, input=None):
+		return SaganNode(self.game.StateKey(state), state, h, victory, self.edge, parent, input)
 
 	def Step(self):
-		# singleton-set minheap containing the initial state.
-		openset = [ SaganNode(self.game, self.edge) ]
-		closedset = set()
+		if self.openset is None:
+			# singleton-set minheap containing the initial state.
+			root = self._Node(self.game.Freeze(), self.game.Heuristic(), self.game.Victory())
+			self.openset = [ root ]
+			self.openkeys = { root.key: root }
+			self.closedset = set()
+		openset, openkeys, closedset = (self.openset, self.openkeys, self.closedset)
 
 		# while lowest rank in OPEN is not the GOAL
-		while not openset[0].Victory() and not self.terminated:
+		while len(openset) and not self.terminated:
+			# a node that's since been reached by a shorter path is just left in the heap
+			if openkeys.get(openset[0].key) is not openset[0]:
+				heappop(openset)
+				continue
+			if openset[0].Victory():
+				break
+
 			# get the best (lowest f=g+h) of the fringe
 			x = heappop(openset)
-			closedset.add(x)
-			for inp in self.game.ValidInputs():
-				self.game.Thaw(x.GetState())
-				self.game.Input(inp)
-				y = SaganNode(self.game, self.edge, x, inp)
+			del openkeys[x.key]
+			closedset.add(x.key)
+			self.current = x
+			for inp, (state, h, victory, defeat) in self.Children(x.GetState()):
+				y = self._Node(state, h, victory, x, inp)
 
-				if y in closedset:  continue
-				yield self.game.Draw() # only show if we've not seen this state yet
+				if y.key in closedset:  continue
+				yield self.DrawState(state) # only show if we've not seen this state yet
 
-				tentative_better = True
-				if y not in openset:  heappush(openset, y)
-				elif x.g + self.edge >= y.g:  tentative_better = False
+				other = openkeys.get(y.key)
+				if other is None or y.g < other.g:
+					openkeys[y.key] = y
+					heappush(openset, y)
 
-				if tentative_better:  x.Adopt(y, inp, self.edge)
+		if not len(openset):
+			print 'Sagan: nowhere left to search.'
+			self.terminated = True
+			return
 
 		self.input_log = openset[0].ReconstructPath()
-		yield self.game.Draw()
+		yield self.DrawState(openset[0].GetState())
 		print 'Sagan: end of A* search.'
 
+	def Progress(self):
+		if self.openset is None:  return ''
+		return 'open: {}, closed: {}'.format(len(self.openkeys), len(self.closedset))
+
+	# the nodes are numbered so the parent links can be saved as a flat list,
+	# rather than as one deep chain of references for pickle to recurse through.
+	# closed nodes are only kept as the ancestors of open ones.
+	def Freeze(self):
+		if self.openset is None:  return {'nodes': [], 'open': 0, 'closed': []}
+		# the node being expanded goes back in the open set, to be expanded again
+		nodes = self.openkeys.values()
+		closed = self.closedset
+		if self.current is not None and self.current.key not in self.openkeys:
+			nodes.append(self.current)
+			closed = closed - set([self.current.key])
+		index = dict( (id(n), i) for i, n in enumerate(nodes) )
+		opened = len(nodes)
+		for n in nodes:
+			p = n.parent
+			while p is not None and id(p) not in index:
+				index[id(p)] = len(nodes)
+				nodes.append(p)
+				p = p.parent
+		flat = []
+		for n in nodes:
+			parent = -1
+			if n.parent is not None:  parent = index[id(n.parent)]
+			flat.append( (n.key, n.state, n.g, n.h, n.victory, parent, getattr(n, 'input', None)) )
+		return {'nodes': flat, 'open': opened, 'closed': list(closed)}
+
+	def Thaw(self, data):
+		if not data['nodes']:  return
+		nodes = []
+		for key, state, g, h, victory, parent, inp in data['nodes']:
+			n = SaganNode(key, state, h, victory)
+			n.g, n.input = (g, inp)
+			nodes.append(n)
+		for n, entry in zip(nodes, data['nodes']):
+			parent = entry[5]
+			n.parent = None
+			if parent >= 0:  n.parent = nodes[parent]
+		self.openset = nodes[:data['open']]
+		heapify(self.openset)
+		self.openkeys = dict( (n.key, n) for n in self.openset )
+		self.closedset = set(data['closed'])
+
 	def Victory(self):
 		return (self.input_log is not None) or self.terminated
 
@@ -6,6 +6,10 @@ Darren Alton
 """
 
 import pygame
+import time
+
+# minimum number of seconds between checks for OS events during a search
+poll_interval = 0.1
 
 class Brain:
 	name = 'unnamed solver'
@@ -24,6 +28,15 @@ class Brain:
 				args[i] = defaultargs[i]
 		self.args = args
 		self.terminated = False
+		# set by the driver when there is no display to draw to or take events from
+		self.headless = False
+		self.last_poll = 0
+		# wall time at which to give up, set by the driver if it has a time limit
+		self.deadline = None
+		# likewise the number of states to give up at, and a function that counts them so far
+		self.nodelimit = None
+		self.CountNodes = None
+		self.caption = ''
 
 	# Note: this should 'yield' pygame surfaces throughout execution,
 	#       but it's acceptable to just 'return' a 1-tuple when finished.
@@ -31,7 +44,63 @@ class Brain:
 	def Step(self):
 		for i in self.game.ValidInputs():
 			self.game.Input(i)
-		return (self.game.Draw(),)
+		return (self.Draw(),)
+
+	# the game's screen, or None if nobody is watching (so the game needn't draw it)
+	def Draw(self):
+		if self.headless:  return None
+		return self.game.Draw()
+
+	# same, but of the given state rather than wherever the game was left
+	def DrawState(self, state):
+		if self.headless:  return None
+		self.game.Thaw(state)
+		return self.game.Draw()
+
+	# the children of a state, as (input, (child_state, heuristic, victory, defeat)) pairs.
+	# the game is thawed first so it can say which inputs are valid from there.
+	def Children(self, state):
+		self.game.Thaw(state)
+		inputs = self.game.ValidInputs()
+		return zip(inputs, self.game.Expand(state, inputs))
+
+	# allow the program to be quit, and respond to OS things while busy.
+	# cheap enough to call once per node, since it only does work every poll_interval
+	# (besides checking the node limit, so brains that don't yield often still keep to it).
+	def PollEvents(self):
+		if self.nodelimit is not None and self.CountNodes() >= self.nodelimit:
+			self.terminated = True
+			return
+		now = time.time()
+		if now - self.last_poll < poll_interval:  return
+		self.last_poll = now
+		if self.deadline is not None and now > self.deadline:
+			self.terminated = True
+		if self.headless:  return
+		pygame.display.set_caption(self.caption)
+		if pygame.event.peek(pygame.QUIT):
+			self.terminated = True
+		else:
+			pygame.event.pump()
+
+	# give some insight to the user.  shown in the window title by PollEvents,
+	# or in the driver's progress log when headless.
+	def Caption(self, s):
+		self.caption = s
+
+	# a short description of how the search is going, for progress logs
+	def Progress(self):
+		return self.caption
+
+	# return everything needed to pick the search up again where it left off,
+	# or None if this brain can't do that, in which case it shouldn't override this.
+	# called between yields of Step.
+	def Freeze(self):
+		return None
+
+	# restore a saved state returned by Freeze, before the first Step
+	def Thaw(self, data):
+		pass
 
 	# true iff a winning path has been found
 	def Victory(self):
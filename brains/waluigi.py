@@ -25,10 +25,15 @@ class Waluigi(Brain):
 		self.method = self.args['method']
 		self.motionblur = self.args['motionblur']
 
+		# keep each child's state on the fringe only if the game's states are small.
+		# otherwise keep just its inputs, and replay them from where the search started.
+		self.keep_states = self.game.snapshot is not None or self.game.small_states
+
 		self.input_log = []
 
 		self.best_state = self.game.Freeze()
 		self.best_heur = self.game.Heuristic()
+		self.step_start = (self.best_state, 0)
 
 		self.screen = pygame.Surface(self.ScreenSize())
 		self.screenmidpoint = self.screen.get_width() / 2
@@ -39,6 +44,7 @@ class Waluigi(Brain):
 
 
 	def _UpdateScreen(self, surf=None, right=True):
+		if self.headless:  return None
 		if surf is None:  surf = self.game.Draw()
 
 		x = 0
@@ -49,15 +55,14 @@ class Waluigi(Brain):
 
 		return self.screen
 
-	def _CheckAndUpdateBest(self, img=None):
+	def _CheckAndUpdateBest(self, img=None, heur=None):
 		# find out if the node we're exploring is promising
 		current = self.game.Freeze()
-		h = self._LookAhead(current)
+		h = self._LookAhead(current, heur)
 		hh = h
 
 		# give some insight to the user
-		s = '{} vs. {}'.format(self.best_heur, h)
-		pygame.display.set_caption(s)
+		self.Caption('{} vs. {}'.format(self.best_heur, h))
 
 		# if it's a new best, update things to reflect that
 		if hh < self.best_heur:
@@ -77,71 +82,91 @@ class Waluigi(Brain):
 			self.game.Input(j)
 
 	def _GrabAndRun(self, fringe, state, render=False):
-		depth,instring = fringe.pop()
+		entry = fringe.pop()
+		depth,instring = entry[:2]
+		kept, h = (None, None)
+		if len(entry) > 2:  kept, h = entry[2:]
+
+		# children from _AddChildren may come with their own state, so there's nothing to
+		# replay (unless we want to draw every step of the way there)
+		if kept is not None and not (render and self.motionblur and not self.headless):
+			self.game.Thaw(kept)
+			if render:
+				return ( depth, instring, h, self.Draw() )
+			return (depth,instring,h)
 
 		if state is not None:
 			self.game.Thaw(state)
 
-		if render and self.motionblur:
+		if render and self.motionblur and not self.headless:
+			# games may hand back the same surface from every Draw, so work on copies
 			surf = self.game.Draw()
+			if surf is not None:
+				surf = surf.copy()
 			for j in instring:
 				self.game.Input(j)
 				stepsurf = self.game.Draw()
 				if surf is None:
-					surf = stepsurf
+					if stepsurf is not None:  surf = stepsurf.copy()
 				else:
+					stepsurf = stepsurf.copy()
 					stepsurf.set_alpha(160)
 					surf.blit(stepsurf, (0,0))
-			return (depth,instring,surf)
+			return (depth,instring,h,surf)
 
 		self._RunString(instring)
 		if render:
-			return ( depth, instring, self.game.Draw() )
+			return ( depth, instring, h, self.Draw() )
 
-		return (depth,instring)
+		return (depth,instring,h)
 
 	# add new children to explore if we haven't hit our limit
 	def _AddChildrenDFS(self, fringe, instring, depth, maxdepth):
 		if depth < maxdepth:
-			for child in self.game.ValidInputs():
-				fringe.append( ( depth+1, instring+[child] ) )
+			for child, (state, h, victory, defeat) in self.Children(self.game.Freeze()):
+				if not self.keep_states:  state = None
+				fringe.append( ( depth+1, instring+[child], state, h ) )
 
 	# same as above, but makes the search breadth-first rather than depth-first
 	def _AddChildrenBFS(self, fringe, instring, depth, maxdepth):
 		if depth < maxdepth:
-			for child in self.game.ValidInputs():
-				fringe.insert( 0, ( depth+1, instring+[child] ) )
-
-	# return the score of the best possible future of a given state
-	def _LookAhead(self, start_state=None):
-		min_heur = self.game.Heuristic()
+			for child, (state, h, victory, defeat) in self.Children(self.game.Freeze()):
+				if not self.keep_states:  state = None
+				fringe.insert( 0, ( depth+1, instring+[child], state, h ) )
+
+	# return the score of the best possible future of a given state.
+	# heur is the state's own score, if Expand already worked it out
+	def _LookAhead(self, start_state=None, heur=None):
+		min_heur = heur
+		if min_heur is None:  min_heur = self.game.Heuristic()
 		maxdepth = self.peek
 		if maxdepth <= 0:
-			pygame.event.pump()
+			self.PollEvents()
 			return min_heur
 
 		if start_state is None:
 			start_state = self.game.Freeze()
 
-		fringe = [(0,[])]
-		while len(fringe) and not self.terminated:
-			depth,instring = self._GrabAndRun(fringe, start_state)
+		# if dead, it's unlikely any children will be improved
+		if self.game.Defeat():
+			return min_heur
 
-			# if dead, it's unlikely any children will be improved
-			if self.game.Defeat():
-				continue
+		# only use DFS for this, not configurable...  shouldn't have to be (yet?)
+		fringe = [(0,start_state)]
+		while len(fringe) and not self.terminated:
+			depth,node = fringe.pop()
+			for child, (state, h, victory, defeat) in self.Children(node):
+				if defeat:
+					continue
 
-			# allow the program to be quit, and respond to OS things while busy
-			if pygame.event.peek(pygame.QUIT):
-				self.terminated = True
-			else:
-				pygame.event.pump()
+				# allow the program to be quit, and respond to OS things while busy
+				self.PollEvents()
 
-			# if we found a new best heuristic, update it
-			min_heur = min( min_heur, self.game.Heuristic() )
+				# if we found a new best heuristic, update it
+				min_heur = min( min_heur, h )
 
-			# only use DFS for this, not configurable...  shouldn't have to be (yet?)
-			self._AddChildrenDFS(fringe, instring, depth, maxdepth)
+				if depth+1 < maxdepth:
+					fringe.append( (depth+1, state) )
 
 		self.game.Thaw(start_state)
 		return min_heur
@@ -151,12 +176,13 @@ class Waluigi(Brain):
 		maxdepth = self.step
 		start_state = self.best_state
 		best_instring = []
+		self.step_start = (start_state, len(self.input_log))
 
 		# otherwise, search properly
 		fringe = [(0,[])]
 		self.best_heur = float('inf')
 		while len(fringe) and not self.terminated:
-			depth,instring,img = self._GrabAndRun(fringe, start_state, render=True)
+			depth,instring,h,img = self._GrabAndRun(fringe, start_state, render=True)
 
 			# prune, don't bother exploring nodes at or past a death
 			if depth > 0 and self.game.Defeat():
@@ -168,7 +194,7 @@ class Waluigi(Brain):
 				break
 
 			# if it's a new best, update things to reflect that
-			if self._CheckAndUpdateBest(img):
+			if self._CheckAndUpdateBest(img, heur=h):
 				best_instring = instring
 
 			yield self._UpdateScreen(surf=img)
@@ -182,6 +208,18 @@ class Waluigi(Brain):
 			print 'Waluigi: got stuck.'
 			self.terminated = True
 
+	# inputs only get committed at the end of a Step, so save things as they were
+	# at the start of this one.  resuming just does the Step over again.
+	def Freeze(self):
+		state, logged = self.step_start
+		return { 'best_state': state,
+		         'input_log':  self.input_log[:logged] }
+
+	def Thaw(self, data):
+		self.best_state = data['best_state']
+		self.input_log = data['input_log']
+		self.step_start = (self.best_state, len(self.input_log))
+
 	def Path(self):
 		return self.input_log
 
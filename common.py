@@ -11,16 +11,39 @@ import cPickle  # a sea cucumber left in brine
 import os       # generic brand cheerios
 import sys      # a nickname that refers to a female sybling
 import time     # an illusion
+import ast      # what you get when you take the 'p' out of 'past'
+import threading  # what a spider does all day
+from timeit import default_timer as timer  # the best clock this platform has
 
 game_path = './games'
 brain_path = './brains'
+heuristic_path = './heuristics'
+
+# what we know about each module without importing it, kept between runs
+index_file = 'output/module_index.pickle'
 
 blacklist = ['skeleton_game', 'skeleton_solver']
 
+# seconds between progress reports when running headless
+progress_interval = 5.0
+
+# seconds between checkpoints of the search, if asked for
+checkpoint_interval = 300.0
+
+# how often ProfiledGame measures the size of a frozen state.  pickling every one just
+# to find out would slow the run down more than the game itself does.
+frozen_sample = 100
+
 sys.path.append(game_path)
 sys.path.append(brain_path)
 
+from skeleton_solver import Brain, poll_interval
+import runfile
+
 class UtilType:
+	def __init__(self):
+		self.index = None
+
 	def ListModules(self, path):
 		files = os.listdir(path)
 		for i in files:
@@ -31,8 +54,65 @@ class UtilType:
 
 	def ListGames(self):  return self.ListModules(game_path)
 	def ListBrains(self): return self.ListModules(brain_path)
+	def ListHeuristics(self): return self.ListModules(heuristic_path)
+
+	# read what we can from a module's source.  importing some of them is
+	# expensive (emulator cores, joysticks...), so we avoid that where we can.
+	def _ScanModule(self, filename):
+		tree = ast.parse(open(filename, 'r').read(), filename)
+		info = { 'doc': ast.get_docstring(tree) or '',
+		         'defaultargs': None,
+		         'validargs': False }
+		for node in tree.body:
+			if isinstance(node, ast.Assign) and len(node.targets) == 1 \
+			   and isinstance(node.targets[0], ast.Name):
+				name = node.targets[0].id
+				if name == 'defaultargs':
+					try:
+						info['defaultargs'] = ast.literal_eval(node.value)
+					except ValueError:
+						pass # not a plain literal, we'll have to import it
+				elif name == 'validargs':
+					info['validargs'] = True
+		return info
+
+	# info about the named module, scanning (only) the files that changed since last time
+	def ModuleInfo(self, modname):
+		if self.index is None:
+			try:
+				self.index = cPickle.load(open(index_file, 'rb'))
+			except Exception:
+				self.index = {}
+
+		for path in (game_path, brain_path, heuristic_path):
+			filename = os.path.join(path, modname + '.py')
+			if os.path.isfile(filename):
+				break
+		else:
+			return None
+
+		mtime = os.path.getmtime(filename)
+		entry = self.index.get(filename)
+		if entry is None or entry[0] != mtime:
+			entry = self.index[filename] = (mtime, self._ScanModule(filename))
+			try:
+				cPickle.dump(self.index, open(index_file, 'wb'), 2)
+			except IOError:
+				pass # read-only checkout or such, just scan again next time
+		return entry[1]
+
+	# the first line of the module's docstring
+	def Describe(self, modname):
+		info = self.ModuleInfo(modname)
+		if info is None:  return ''
+		return info['doc'].split('\n')[0]
 
 	def GetArgs(self, modname):
+		# no need to import the module if its source told us everything
+		info = self.ModuleInfo(modname)
+		if info is not None and info['defaultargs'] is not None and not info['validargs']:
+			return (info['defaultargs'].copy(), {})
+
 		mod = __import__(modname)
 		validators = {}
 		if hasattr(mod, 'validargs'):
@@ -42,53 +122,392 @@ class UtilType:
 util = UtilType()
 
 
+# the primitives of a game that ProfiledGame keeps track of
+profiled_methods = ['Input', 'Expand', 'RunPopulation', 'Push', 'Pop', 'Freeze', 'Thaw', 'StateKey', 'Heuristic', 'Victory', 'Defeat', 'Draw']
+
+# stands in for a game, counting calls to its primitives and the time spent in them.
+# anything else is passed straight through to the game.
+class ProfiledGame:
+	def __init__(self, game):
+		self.game = game
+		self.calls = dict.fromkeys(profiled_methods, 0)
+		self.times = dict.fromkeys(profiled_methods, 0.0)
+		self.frozen_bytes = 0
+		self.frozen_max = 0
+		self.frozen_measured = 0
+		self.expanded = 0
+		self.stepped = 0
+		for name in profiled_methods:
+			setattr(self, name, self._Wrap(name, getattr(game, name)))
+
+	def __getattr__(self, name):
+		return getattr(self.game, name)
+
+	def _Wrap(self, name, method):
+		calls, times = (self.calls, self.times)
+		def wrapped(*args):
+			start = timer()
+			ret = method(*args)
+			times[name] += timer() - start
+			calls[name] += 1
+			if name == 'Freeze':  self._CountFrozen(ret)
+			elif name == 'Expand':  self.expanded += len(ret)
+			elif name == 'RunPopulation':  self._CountStepped(args[1], ret)
+			return ret
+		return wrapped
+
+	# how big the states we're asked to keep around are, going by one in every frozen_sample
+	def _CountFrozen(self, state):
+		if (self.calls['Freeze'] - 1) % frozen_sample:  return
+		self.frozen_measured += 1
+		if type(state) is str:
+			size = len(state)
+		else:
+			size = len(cPickle.dumps(state, 2))
+		self.frozen_bytes += size
+		self.frozen_max = max(self.frozen_max, size)
+
+	# inputs RunPopulation went through: all of each dna, or up to where it won
+	def _CountStepped(self, dnas, results):
+		for dna, (fitness, steps) in zip(dnas, results):
+			self.stepped += steps if steps > 0 else len(dna)
+
+	# states searched, whether by Input, Push, a whole Expand or a whole population at once
+	def Nodes(self):
+		return self.calls['Input'] + self.calls['Push'] + self.expanded + self.stepped
+
+	def Summary(self):
+		return { 'calls':           dict(self.calls),
+		         'times':           dict(self.times),
+		         'expanded':        self.expanded,
+		         'stepped':         self.stepped,
+		         'frozen_bytes':    self.frozen_bytes,
+		         'frozen_max':      self.frozen_max,
+		         'frozen_measured': self.frozen_measured }
+
+	def Report(self, elapsed):
+		lines = ['Profile:        {:>10} {:>10} {:>10} {:>6}'.format('calls', 'total s', 'usec/call', '%')]
+		for name in profiled_methods:
+			calls, t = (self.calls[name], self.times[name])
+			if not calls:  continue
+			lines.append('  {:13} {:10} {:10.3f} {:10.2f} {:6.1f}'.format(
+				name, calls, t, 1e6 * t / calls, 100 * t / max(elapsed, 1e-9)))
+		if self.expanded:
+			lines.append('  expanded children: {}'.format(self.expanded))
+		if self.stepped:
+			lines.append('  population inputs: {}'.format(self.stepped))
+		frozen = self.frozen_measured
+		if frozen:
+			lines.append('  frozen states: {} bytes average, {} bytes max (of {} measured)'.format(
+				self.frozen_bytes / frozen, self.frozen_max, frozen))
+		return '\n'.join(lines)
+
+
+# make a Driver to carry on with the run saved in a checkpoint file
+def LoadCheckpoint(filename, **kwargs):
+	data = cPickle.load(open(filename, 'rb'))
+	driver = Driver(data['game'], data['brain'], data['game_args'], data['brain_args'], **kwargs)
+	driver.Resume(data)
+	return driver
+
+
 class Driver:
-	def __init__(self, game_mod_name, brain_mod_name, game_args={}, brain_args={}, scale=1):
+	# fps and skip limit how many of the brain's surfaces actually get shown:
+	# at most fps per second, and only every skip'th one.  the rest are dropped untouched.
+	# with profile, the brain plays a ProfiledGame and the totals are reported after Run.
+	# with checkpoint, the search is saved there every checkpoint_interval seconds
+	# (and when interrupted), to be picked up again with Resume.
+	def __init__(self, game_mod_name, brain_mod_name, game_args={}, brain_args={}, scale=1,
+	             headless=False, log=None, fps=None, skip=1, profile=False, checkpoint=None):
+		# the args as given, for checkpoints.  the game and brain parse (and fill in) the
+		# dicts they're handed, and parsing their results again could change them.
+		self.game_args = dict(game_args)
+		self.brain_args = dict(brain_args)
+
 		self.game = __import__(game_mod_name).LoadedGame(game_args)
-		self.brain = __import__(brain_mod_name).LoadedBrain(self.game, brain_args)
+		self.profiler = None
+		if profile:
+			self.profiler = ProfiledGame(self.game)
+			self.brain = __import__(brain_mod_name).LoadedBrain(self.profiler, brain_args)
+		else:
+			self.brain = __import__(brain_mod_name).LoadedBrain(self.game, brain_args)
+
+		# without a display, the brain shouldn't bother drawing or polling for events
+		self.headless = headless
+		self.brain.headless = headless
+
+		self.log = sys.stdout
+		if log is not None:
+			self.log = open(log, 'a')
 
 		self.scale = scale
+		self.screen = None
+		self.scaled = None
+		self.fps = fps
+		self.skip = skip
+
+		# filled in by Run, for Stats
+		self.frames = 0
+		self.elapsed = 0
+
+		self.checkpoint = checkpoint
+		self.writer = None
+
+		# the run file the path is being written to as it's found, if any
+		self.stream = None
+		self.streamed = []
+
+		if not headless:
+			xmax, ymax = self.brain.ScreenSize()
+			self.winsize = (xmax*scale, ymax*scale)
+			self.screen = pygame.display.set_mode(self.winsize)
+
+	# scale into a surface we keep around, rather than making a new one each frame
+	def _Scale(self, surf):
+		if self.scale == 1:  return surf
+		scaled = self.scaled
+		if scaled is None or scaled.get_bitsize() != surf.get_bitsize() \
+		                  or scaled.get_masks() != surf.get_masks():
+			scaled = self.scaled = pygame.Surface(self.winsize, 0, surf)
+		return pygame.transform.scale(surf, self.winsize, scaled)
+
+	def _Show(self, surf):
+		self.screen.blit(self._Scale(surf), (0,0))
+		pygame.display.flip()
+
+	# everything needed to pick the run up again later
+	def _CheckpointData(self):
+		return { 'game':        self.game.__class__.name,
+		         'game_args':   self.game_args,
+		         'brain':       self.brain.__class__.name,
+		         'brain_args':  self.brain_args,
+		         'game_state':  self.game.Freeze(),
+		         'brain_state': self.brain.Freeze(),
+		         'frames':      self.frames,
+		         'elapsed':     self.elapsed + time.time() - self.started }
+
+	# write to a temporary file and move it into place,
+	# so dying halfway through can't ruin the last good checkpoint.
+	def _WriteCheckpoint(self, data):
+		tmp = self.checkpoint + '.tmp'
+		f = open(tmp, 'wb')
+		cPickle.dump(data, f, 2)
+		f.close()
+		# elsewhere, rename replaces the old one in one go
+		if os.name == 'nt' and os.path.exists(self.checkpoint):
+			os.remove(self.checkpoint) # windows won't rename over it
+		os.rename(tmp, self.checkpoint)
+
+	# true if the last checkpoint is still being written
+	def _Writing(self):
+		if self.writer is None:
+			return False
+		if type(self.writer) is int:
+			if os.waitpid(self.writer, os.WNOHANG)[0] == 0:
+				return True
+		elif self.writer.is_alive():
+			return True
+		self.writer = None
+		return False
 
-		xmax, ymax = self.brain.ScreenSize()
-		self.winsize = (xmax*scale, ymax*scale)
-		self.screen = pygame.display.set_mode(self.winsize)
+	def _WaitForWriter(self):
+		if self.writer is None:  return
+		if type(self.writer) is int:
+			os.waitpid(self.writer, 0)
+		else:
+			self.writer.join()
+		self.writer = None
 
-	def Run(self):
+	# save the search in the background.  if we can fork, the child gets a snapshot of
+	# our memory for free and does all the work while the search carries on.  otherwise
+	# we gather the data here, and leave only the pickling and disk to a thread.
+	def Checkpoint(self, wait=False):
+		if self._Writing():
+			if not wait:  return # still busy with the last one, try again later
+			self._WaitForWriter()
+
+		if wait:
+			self._WriteCheckpoint(self._CheckpointData())
+		elif hasattr(os, 'fork'):
+			pid = os.fork()
+			if pid == 0:
+				try:
+					self._WriteCheckpoint(self._CheckpointData())
+				finally:
+					os._exit(0)
+			self.writer = pid
+		else:
+			self.writer = threading.Thread(target=self._WriteCheckpoint, args=(self._CheckpointData(),))
+			self.writer.start()
+
+	# pick up a run from a checkpoint written by a Driver with the same game and brain
+	def Resume(self, data):
+		self.game.Thaw(data['game_state'])
+		self.brain.Thaw(data['brain_state'])
+		self.frames = data['frames']
+		self.elapsed = data['elapsed']
+
+	def _Header(self):
+		return { 'game':       self.game.__class__.name,
+		         'game_args':  self.game.args,
+		         'brain':      self.brain.__class__.name,
+		         'brain_args': self.brain.args }
+
+	# the brain's path as the game would have it played back
+	def _Path(self):
+		return self.game.Unroll(self.brain.Path())
+
+	# true if path carries on from what we've already written to the run file
+	def _Extends(self, path):
+		n = len(self.streamed)
+		return path is not None and len(path) >= n and path[:n] == self.streamed
+
+	# append any new inputs to the run file.  brains that rewrite their path
+	# (rather than just adding to it) are left alone until Save.
+	def _StreamPath(self):
+		path = self._Path()
+		if self._Extends(path) and len(path) > len(self.streamed):
+			new = path[len(self.streamed):]
+			self.stream.Append(new)
+			self.streamed += new
+
+	def Log(self, *words):
+		print >>self.log, ' '.join(str(i) for i in words)
+		self.log.flush()
+
+	# timelimit is in seconds of wall time.  the brain is told about it too,
+	# so it can give up in the middle of a long Step.
+	# nodelimit is a number of states searched (see ProfiledGame.Nodes), checked between frames
+	# and by the brain as it polls for events (so it needs profile, to count them).
+	# if stream is the name of a run file, the path is written there as it grows.
+	def Run(self, timelimit=None, stream=None, nodelimit=None):
+		if nodelimit is not None and self.profiler is None:
+			raise Exception('Driver: a node limit needs profile on, to count nodes.')
 		running = True
-		print 'Driver: Started at', time.asctime()
-		while running:
-			# let the pathfinder take a step, get screens to show throughout
-			for surf in self.brain.Step():
-				# process events
-				for event in pygame.event.get():
-					# pass events on to the pathfinder in case it takes input etc.
-					self.brain.Event(event)
-					if event.type == pygame.QUIT:
-						running = False
-				# if relevant, draw the screen
-				if surf is not None:
-					# scale it, and show it
-					scaled = surf
-					if self.scale != 1:
-						scaled = pygame.transform.scale(surf, self.winsize)
-					self.screen.blit(scaled, (0,0))
-				pygame.display.flip()
-			pygame.display.flip()
-
-			if self.brain.Victory():
-				running = False
-		print 'Driver: Finished at', time.asctime()
+		start = last_report = last_checkpoint = last_stream = self.started = time.time()
+		if stream is not None and runfile.IsRunFile(stream):
+			self.stream = runfile.RunWriter(stream, self._Header())
+			self.streamed = []
+		last_draw = last_poll = 0
+		surfaces = 0
+		deadline = None
+		if timelimit is not None:
+			deadline = start + timelimit
+			self.brain.deadline = deadline
+		if nodelimit is not None:
+			self.brain.nodelimit = nodelimit
+			self.brain.CountNodes = self.profiler.Nodes
+		# brains that can't be checkpointed leave Freeze as it is.  actually calling it to
+		# find out would copy a whole resumed search.
+		if self.checkpoint is not None and self.brain.__class__.Freeze.im_func is Brain.Freeze.im_func:
+			self.Log('Driver: {} can\'t be checkpointed.'.format(self.brain.__class__.name))
+			self.checkpoint = None
+		self.Log('Driver: Started at', time.asctime())
+		try:
+			while running:
+				dropped = None
+				# let the pathfinder take a step, get screens to show throughout
+				for surf in self.brain.Step():
+					self.frames += 1
+					now = time.time()
+					if deadline is not None and now > deadline:
+						self.Log('Driver: Out of time.')
+						self.brain.terminated = True
+						break
+					if nodelimit is not None and self.profiler.Nodes() >= nodelimit:
+						self.Log('Driver: Out of nodes.')
+						self.brain.terminated = True
+						break
+					if self.checkpoint is not None and now - last_checkpoint >= checkpoint_interval:
+						last_checkpoint = now
+						self.Checkpoint()
+					if self.stream is not None and now - last_stream >= progress_interval:
+						last_stream = now
+						self._StreamPath()
+					# nobody's watching, so just let them know we're still alive now and then
+					if self.headless:
+						if now - last_report >= progress_interval:
+							last_report = now
+							self.Log('Driver: {:.0f}s elapsed.'.format(now - start), self.brain.Progress())
+						continue
+					# decide whether this one's worth showing
+					show = False
+					if surf is not None:
+						surfaces += 1
+						show = surfaces % self.skip == 0 and \
+						       (self.fps is None or now - last_draw >= 1.0 / self.fps)
+						dropped = surf
+					# if not, don't spend any more time on it than we have to
+					if not show and now - last_poll < poll_interval:
+						continue
+					last_poll = now
+					# process events
+					for event in pygame.event.get():
+						# pass events on to the pathfinder in case it takes input etc.
+						self.brain.Event(event)
+						if event.type == pygame.QUIT:
+							running = False
+					# if relevant, draw the screen
+					if show:
+						last_draw = now
+						dropped = None
+						self._Show(surf)
+				# make sure the screen ends up showing where the step left off
+				if dropped is not None:
+					self._Show(dropped)
+
+				if self.brain.Victory() or self.brain.terminated:
+					running = False
+		except KeyboardInterrupt:
+			# stop the search, but still let the caller save what we have
+			self.Log('Driver: Interrupted.')
+			if self.checkpoint is not None:
+				self.Log('Driver: Saving checkpoint to', self.checkpoint)
+				self.Checkpoint(wait=True)
+			self.brain.terminated = True
+		self._WaitForWriter()
+		self.elapsed += time.time() - start
+		self.Log('Driver: Finished at', time.asctime())
+		if self.profiler is not None:
+			self.Log(self.profiler.Report(self.elapsed))
+
+	# a summary of how the last Run went
+	def Stats(self):
+		path = self._Path()
+		pathlen = None
+		if path is not None:  pathlen = len(path)
+		stats = { 'solved':  pathlen is not None and not self.brain.terminated,
+		          'pathlen': pathlen,
+		          'time':    self.elapsed,
+		          'frames':  self.frames }
+		if path is not None:
+			stats.update(self.game.PathStats(path))
+		stats.update(self.game.RunStats())
+		if self.profiler is not None:
+			stats['nodes'] = self.profiler.Nodes()
+			stats['profile'] = self.profiler.Summary()
+		return stats
 
 	def Save(self, output, screenshot=None):
-		result = {
-			'game':       self.game.__class__.name,
-			'game_args':  self.game.args,
-			'brain':      self.brain.__class__.name,
-			'brain_args': self.brain.args,
-			'path':       self.brain.Path(),
-			'state':      self.game.Freeze()
-		}
-		cPickle.dump( result, open(output, 'w') )
-
-		if screenshot is not None:
+		path = self._Path()
+		if runfile.IsRunFile(output):
+			# finish off the file we've been streaming to, if it's still any good
+			stream, self.stream = (self.stream, None)
+			if stream is None or stream.filename != output or not self._Extends(path):
+				if stream is not None:  stream.Finish()
+				stream = runfile.RunWriter(output, self._Header())
+				self.streamed = []
+			if path is not None:
+				stream.Append(path[len(self.streamed):])
+			stream.Finish(self.game.Freeze(), self.Stats())
+		else:
+			result = self._Header()
+			result.update({
+				'path':       path,
+				'state':      self.game.Freeze(),
+				'stats':      self.Stats()
+			})
+			cPickle.dump( result, open(output, 'w') )
+
+		if screenshot is not None and self.screen is not None:
 			pygame.image.save(self.screen, screenshot)
@@ -16,24 +16,37 @@ game_mod_name, brain_mod_name = ('maze', 'sagan')
 game_args, brain_args = ({}, {})
 
 scale = 1                          # we may want to make the display output bigger
-output = 'output/last_run.pickle'  # default value for the output pickle
+output = 'output/last_run.run'     # default value for the output file (or use a .pickle)
+headless = False                   # search at full speed without opening a window
+log = None                         # where progress goes when headless (default stdout)
+fps = None                         # show at most this many of the brain's frames per second
+skip = 1                           # ...and only every skip'th one
+profile = False                    # time the game's primitives and report at the end
+checkpoint = None                  # save the search here now and then, to be resumed later
+resume = None                      # pick up a search from one of those checkpoints
 
 
 
 def usage():
+	def describe(names):
+		return '\n'.join( '  {:12} {}'.format(i, common.util.Describe(i)) for i in sorted(names) )
 	return """
 todo: help.  for now, here's a list of game and brain modules:
+games:
 {}
+brains:
 {}
-""".format( list(common.util.ListGames()),
-            list(common.util.ListBrains()) )
+""".format( describe(common.util.ListGames()),
+            describe(common.util.ListBrains()) )
 
 
 
 if __name__ == "__main__":
 	# parse command line arguments
 	try:
-		opts, args = getopt.getopt(sys.argv[1:], "hg:b:s:o:", ["help", "game=", "brain=", "scale=", "output="])
+		opts, args = getopt.getopt(sys.argv[1:], "hg:b:s:o:Hl:f:k:pc:r:", ["help", "game=", "brain=", "scale=", "output=",
+		                                                                "headless", "log=", "fps=", "skip=",
+		                                                                "profile", "checkpoint=", "resume="])
 
 		for o,a in opts:
 			if o in ('-h', '--help'):
@@ -55,11 +68,31 @@ if __name__ == "__main__":
 				scale = int(a)
 			elif o in ('-o', '--output'):
 				output = a
+			elif o in ('-H', '--headless'):
+				headless = True
+			elif o in ('-l', '--log'):
+				log = a
+			elif o in ('-f', '--fps'):
+				fps = float(a)
+			elif o in ('-k', '--skip'):
+				skip = int(a)
+			elif o in ('-p', '--profile'):
+				profile = True
+			elif o in ('-c', '--checkpoint'):
+				checkpoint = a
+			elif o in ('-r', '--resume'):
+				resume = a
 	except getopt.GetoptError, err:
 		print str(err), usage()
 		sys.exit(2)
 
 	# run optiness with parsed arguments
-	driver = common.Driver(game_mod_name, brain_mod_name, game_args, brain_args, scale)
-	driver.Run()
+	if resume is not None:
+		# the game and brain come from the checkpoint, and we keep checkpointing to it by default
+		driver = common.LoadCheckpoint(resume, scale=scale, headless=headless, log=log, fps=fps,
+		                               skip=skip, profile=profile, checkpoint=checkpoint or resume)
+	else:
+		driver = common.Driver(game_mod_name, brain_mod_name, game_args, brain_args, scale, headless, log,
+		                       fps, skip, profile, checkpoint)
+	driver.Run(stream=output)
 	driver.Save(output)
@@ -5,33 +5,91 @@ A straightforward brainfuck interpreter in Python
 Darren Alton
 
 Object: To code a brainfuck program that prints a given string.
+(Or, given many, a short program that prints each.)
 """
 
 from skeleton_game import Game
 
+import os
 import pygame
+from array import array
 
 defaultargs = { 'output':        'foo',
                 'max_loop':      1000,
-                'bits_per_cell': 8, }
+                'bits_per_cell': 8,
+                'prune':         False,   # only offer opcodes that could do something new
+                'targets':       None, }  # many outputs to find programs for, instead of output
+
+# a list of targets, or the name of a file of them, one per line (blank lines skipped)
+def read_targets(targets):
+    if type(targets) is str:
+        targets = [i for i in open(targets).read().splitlines() if i]
+    return sorted(set(targets))
+
+def _valid_targets(x):
+    if type(x) is str:
+        return os.path.isfile(x) and len(read_targets(x)) > 0
+    return x is None or (type(x) in (list, tuple) and len(x) > 0 and all(type(i) is str for i in x))
 
 validargs =   { 'output':        lambda x: type(x) is str,
                 'max_loop':      lambda x: type(x) is int and x > 0,
-                'bits_per_cell': lambda x: type(x) is int and 0 < x <= 64 }
+                'bits_per_cell': lambda x: type(x) is int and 0 < x <= 64,
+                'prune':         [True, False],
+                'targets':       _valid_targets }
+
+# in prune mode, opcodes that undo the one before them aren't offered
+undoes = { '+': '-', '-': '+', '<': '>', '>': '<' }
 
 class InfiniteLoopException(Exception): pass
 
 class Brainfuck(Game):
     name = 'brainfuck'
+    search_args = ('prune',)
+    small_states = True
 
     def __init__(self, args = {}):
         Game.__init__(self, args, defaultargs, validargs)
 
-        self.program = ''
-        self.current_output = ''
         self.desired_output = self.args['output']
         self.iter_max = self.args['max_loop']
         self.bit_mask = (1 << self.args['bits_per_cell']) - 1
+        self.prune = self.args['prune']
+        self.tape_type = None
+        for i in 'BHIL':
+            if array(i).itemsize * 8 >= self.args['bits_per_cell']:
+                self.tape_type = i
+                break
+
+        # the program, how many of its loops are still open, and the machine as it was at
+        # some point with none open, up to the first of those: (length of the program run
+        # so far, tape, head position, output, whether it stopped early), or None if the
+        # program is invalid.  the tape is copied before it's changed, so states share it.
+        self.program = ''
+        self.opened = 0
+        self.machine = (0, self._Tape([0]), 0, '', False)
+        self.current_output = ''
+
+        # with many targets, a trie of them.  each node is [length of the shortest target
+        # below it that no program has printed yet, its children by character, whether a
+        # target ends there].  found is the shortest program seen so far that printed each.
+        self.targets = None
+        self.longest = len(self.desired_output)
+        if self.args['targets'] is not None:
+            self.targets = read_targets(self.args['targets'])
+            self.longest = max(len(i) for i in self.targets)
+            self.trie = [float('inf'), {}, False]
+            for target in self.targets:
+                node = self.trie
+                node[0] = min(node[0], len(target))
+                for c in target:
+                    node = node[1].setdefault(c, [float('inf'), {}, False])
+                    node[0] = min(node[0], len(target))
+                node[2] = True
+            self.found = {}
+
+        # in prune mode, the best program found so far that got the machine into each
+        # state (by StateKey), as (length, program)
+        self.seen = {}
 
         # , is omitted because it could just produce a BF implementation of cat
         self.inputs = { 'hat0_up':    '+',
@@ -48,13 +106,12 @@ class Brainfuck(Game):
 
     def Heuristic(self):
         # if we have a ] before [, never fixed by appending more opcodes...
-        if not self.ValidProgram(self.program):
+        if self.machine is None:
             return float('inf')
 
-        try:
-            output = self.InterpretBF(self.program)
-        except Exception, e:
-            output = e.message
+        output = self.Output()
+        if self.targets is not None:
+            return self._TargetsHeuristic(output)
 
         # if we've gone too far, dead end
         if len(output) > len(self.desired_output):
@@ -69,94 +126,280 @@ class Brainfuck(Game):
             characters_remaining -= 1
         return characters_remaining
 
+    # with many targets, the fewest characters left to print any that's still to be
+    # found.  printing one exactly finds it, which the search goes on past.  the
+    # programs found aren't always the shortest: a target is found by the first program
+    # scored that prints it, and finding one raises the heuristic of states a brain
+    # already has queued (like sagan's open set) without their priorities changing.
+    def _TargetsHeuristic(self, output):
+        if len(self.found) == len(self.targets):
+            return 0
+        path = [self.trie]
+        for c in output:
+            node = path[-1][1].get(c)
+            if node is None:
+                return float('inf')
+            path.append(node)
+        if path[-1][2]:
+            if output not in self.found:
+                self.found[output] = self.program
+                for depth in xrange(len(path) - 1, -1, -1):
+                    node = path[depth]
+                    shortest = float('inf')
+                    if node[2] and output[:depth] not in self.found:
+                        shortest = depth
+                    node[0] = min([shortest] + [i[0] for i in node[1].values()])
+                if len(self.found) == len(self.targets):
+                    return 0
+            elif len(self.program) < len(self.found[output]):
+                self.found[output] = self.program
+        return path[-1][0] - len(output)
+
     def Input(self, n):
-        self.program += n
-        self.current_output = None
+        self.Thaw(self._Append(self.Freeze(), n))
+
+    # the state's parts are never changed in place (_Run works on a copy of the tape),
+    # so undoing an opcode is just putting the old ones back, cached output and all
+    def Push(self, n):
+        self.pushed.append( (self.program, self.opened, self.machine, self.current_output) )
+        self.Input(n)
+
+    def Pop(self):
+        self.program, self.opened, self.machine, self.current_output = self.pushed.pop()
+
+    # with no loop left open, an appended opcode other than . can't change the output
+    # ([ starts an empty loop, which is skipped), so those children share the parent's score.
+    def Expand(self, state, inputs):
+        self.Thaw(state)
+        h = self.Heuristic()
+        opened = state[1]
+        children = []
+        for op in inputs:
+            child = self._Append(state, op)
+            if child[2] is None:
+                ch = float('inf') # a ] too many is never fixed
+            elif opened == 0 and op != '.':
+                ch = h
+            else:
+                self.Thaw(child)
+                ch = self.Heuristic()
+            children.append( (child, ch, ch <= 0, ch == float('inf')) )
+        return children
+
+    # programs that start the same are only run as far as they do once, by walking them
+    # down a trie of the programs so far.  each node of the trie is (state, output,
+    # heuristic, children by opcode).  the output is None if the program is invalid.
+    def _TrieNode(self, state):
+        self.Thaw(state)
+        h = self.Heuristic()
+        return (state, self.current_output, h, {})
+
+    def _TrieChild(self, node, n):
+        child = node[3].get(n)
+        if child is None:
+            child = node[3][n] = self._TrieNode(self._Append(node[0], n))
+        return child
+
+    # the (output, heuristic) of each of programs appended to state, in order
+    def Evaluate(self, state, programs):
+        root = self._TrieNode(state)
+        results = []
+        for program in programs:
+            node = root
+            for n in program:
+                node = self._TrieChild(node, n)
+            results.append( (node[1], node[2]) )
+        return results
+
+    # the same as Game.RunPopulation, but through the trie.  once a program has a ] too
+    # many, nothing after it matters.
+    def RunPopulation(self, state, dnas):
+        root = self._TrieNode(state)
+        results = []
+        for dna in dnas:
+            node = root
+            steps = -1
+            for i, n in enumerate(dna):
+                node = self._TrieChild(node, n)
+                if node[2] <= 0:
+                    steps = i + 1
+                    break
+                if node[0][2] is None:
+                    break
+            results.append( (node[2], steps) )
+        return results
+
+    # with many targets, the programs found for them, which are the point of the run
+    def RunStats(self):
+        if self.targets is None:
+            return {}
+        return { 'targets':  len(self.targets),
+                 'found':    len(self.found),
+                 'programs': dict(self.found) }
 
     def HumanInputs(self): return self.inputs
-    def ValidInputs(self): return self.inputs.values()
+
+    # in prune mode, a program that leaves the machine the same as a shorter one (or one
+    # as short that sorts first) gets no opcodes at all.  otherwise, leave out those that
+    # can't do anything new: one that undoes the last, a ] that closes an empty loop or
+    # none at all, and a [ where the cell is still zero from the start or from the loop
+    # that just closed, which would skip it.
+    def ValidInputs(self):
+        if not self.prune:
+            return self.inputs.values()
+        key = self.StateKey(self.Freeze())
+        here = (len(self.program), self.program)
+        if self.seen.get(key, here) < here:
+            return []
+        self.seen[key] = here
+        last = self.program[-1:]
+        inputs = []
+        for op in self.inputs.values():
+            if op == undoes.get(last):  continue
+            if op == ']' and (not self.opened or last == '['):  continue
+            if op == '[' and last in ('', ']'):  continue
+            inputs.append(op)
+        return inputs
 
     def Freeze(self):
-        return self.program
+        return (self.program, self.opened, self.machine)
     def Thaw(self, data):
-        self.program = data
+        self.program, self.opened, self.machine = data
         self.current_output = None
 
-    # check for bracket balance, being forgiving about the end of the program
-    def ValidProgram(self, subprog):
-        balance = 0
-        for i in xrange(len(subprog)):
-            if   subprog[i] == '[': balance += 1
-            elif subprog[i] == ']': balance -= 1
-            if balance < 0:         return False
-        return True
-
-    # implicitly closes open brackets, just like the TI-83
-    def BracketedSubstring(self, subprog):
-        balance = 0
-        has_nonbracket = False
-        for i in xrange(len(subprog)):
-            if subprog[i] == '[':
-                balance += 1
-            elif subprog[i] == ']':
-                balance -= 1
+    # the tapes in states aren't hashable, and the program says everything anyway.
+    # in prune mode, programs that leave the machine the same are the same: the part of
+    # the tape that isn't zero, where the head is on it, the output, and whatever's in
+    # the loop still open (the machine has run everything before that, in prune mode).
+    # once the machine has stopped, only its output and how many ] would still fit matter.
+    def StateKey(self, state):
+        if not self.prune:
+            return state[0]
+        program, opened, machine = state
+        if machine is None:
+            return None
+        settled, tape, position, output, stopped = machine
+        if stopped:
+            return (output, opened)
+        cells = [i for i in xrange(len(tape)) if tape[i]] or [position]
+        return (tuple(tape[cells[0]:cells[-1]+1]), position - cells[0], output, program[settled:])
+
+    # the state with opcode n appended.  once no loop is left open, the machine runs
+    # whatever it hasn't yet, so a loop is run once when it's closed rather than again
+    # for every opcode after it.  a program with a ] too many has no machine at all.
+    def _Append(self, state, n):
+        program, opened, machine = state
+        program += n
+        if machine is None:
+            return (program, opened, None)
+        if n == '[':
+            return (program, opened + 1, machine)
+        if n == ']':
+            if not opened:
+                return (program, opened, None)
+            opened -= 1
+        settled, tape, position, output, stopped = machine
+        # until there's a . the output can only be empty, so don't bother running it yet
+        # (unless the machine is wanted for StateKey)
+        if opened or stopped or (not output and not self.prune and program.find('.', settled) < 0):
+            return (program, opened, machine)
+        tape, position, output, stopped = self._Run(program[settled:], tape[:], position, output)
+        return (program, opened, (len(program), tape, position, output, stopped))
+
+    # what the program prints, or the message of whatever stopped it.  only the loop
+    # that's still open is interpreted, from where the machine left off before it.
+    def Output(self):
+        if self.current_output is None:
+            settled, tape, position, output, stopped = self.machine
+            rest = self.program[settled:]
+            if stopped or not rest or (not output and '.' not in rest):
+                self.current_output = output # shortcut!
             else:
-                has_nonbracket = True
-            if balance < 0:
-                return subprog[:i]
-        if has_nonbracket:
-            return subprog
-        return '' # performance hack, since [[][][[]]] and [] are equivalent
-
-    def InterpretBF(self, prog):
-        if '.' not in prog:
-            self.current_output = '' # shortcut!
-        elif self.current_output is None:
-            self.tape = [0]
-            self.position = 0
-            self.current_output = self.InterpretBFSub(prog)
+                self.current_output = self._Run(rest, tape[:], position, output)[2]
         return self.current_output
 
-    def InterpretBFSub(self, prog):
-        output = ''
+    # a fresh tape of cells, in the smallest array that holds bits_per_cell
+    def _Tape(self, cells):
+        if self.tape_type is None:
+            return list(cells)
+        return array(self.tape_type, cells)
+
+    # run code on the given tape (which it changes), appending to output.  returns the
+    # tape, head position and output afterwards, and whether it stopped early, in which
+    # case the output is the message of what stopped it.
+    def _Run(self, code, tape, position, output):
+        # compile the brackets into a jump table.  a [ jumps to its ], or past the end if
+        # it's never closed (just like the TI-83), or is None if its loop does nothing.
+        jump = [None] * len(code)
+        opened = []
+        for pc in xrange(len(code)):
+            if code[pc] == '[':
+                opened.append(pc)
+            elif code[pc] == ']':
+                jump[opened.pop()] = pc
+        last_op = max(code.rfind(i) for i in '+-<>.')
+        for pc in opened:
+            if last_op > pc:
+                jump[pc] = len(code)
+        for pc in xrange(len(code) - 1):
+            if jump[pc] == pc + 1:
+                jump[pc] = None # performance hack, since [[][][[]]] and [] are equivalent
+
+        mask = self.bit_mask
+        blank = self._Tape([0])
+        output = list(output)
+        loops = [] # [start, end, iterations, len(output) when the iteration began]
+        end = len(code)
         pc = 0
-        while pc < len(prog):
-            opcode = prog[pc]
-            pc += 1
-            if opcode == '.':   output += chr(self.tape[self.position])
-            elif opcode == '+':
-                self.tape[self.position] += 1
-                self.tape[self.position] &= self.bit_mask
-            elif opcode == '-':
-                self.tape[self.position] -= 1
-                self.tape[self.position] &= self.bit_mask
-            elif opcode == '>':
-                self.position += 1
-                if len(self.tape) <= self.position:
-                    self.tape.append(0)
-            elif opcode == '<':
-                if self.position == 0:
-                    self.tape.insert(0, 0)
-                else:
-                    self.position -= 1
-            elif opcode == '[':
-                loop_body = self.BracketedSubstring(prog[pc:])
-                if not loop_body: continue # shortcut!
-                iter_count = 0 # FIXME when halting problem is solved
-                while self.tape[self.position]:
-                    output += self.InterpretBFSub(loop_body)
-                    iter_count += 1
-                    if iter_count > self.iter_max:
-                        raise InfiniteLoopException(output)
-                pc += len(loop_body) + 1
-        return output
+        try:
+            while True:
+                if pc >= end:
+                    if not loops:
+                        break
+                    loop = loops[-1]
+                    loop[2] += 1 # FIXME when halting problem is solved
+                    if loop[2] > self.iter_max:
+                        # with what the code around the loop printed, as far as it got
+                        raise InfiniteLoopException(''.join(output[loops[-2][3] if len(loops) > 1 else 0:]))
+                    if tape[position]:
+                        pc = loop[0] + 1
+                        loop[3] = len(output)
+                        continue
+                    loops.pop()
+                    pc = loop[1] + 1
+                    end = loops[-1][1] if loops else len(code)
+                    continue
+
+                opcode = code[pc]
+                pc += 1
+                if opcode == '.':   output.append(chr(tape[position]))
+                elif opcode == '+': tape[position] = (tape[position] + 1) & mask
+                elif opcode == '-': tape[position] = (tape[position] - 1) & mask
+                elif opcode == '>':
+                    position += 1
+                    if position == len(tape):
+                        tape.extend(blank * len(tape))
+                elif opcode == '<':
+                    if position == 0:
+                        position = len(tape)
+                        tape[:0] = blank * len(tape)
+                    position -= 1
+                elif opcode == '[' and jump[pc-1] is not None:
+                    if tape[position]:
+                        loops.append([pc-1, jump[pc-1], 0, len(output)])
+                        end = jump[pc-1]
+                    else:
+                        pc = jump[pc-1] + 1
+        except Exception, e:
+            return (tape, position, e.message, True)
+        return (tape, position, ''.join(output), False)
 
     def Draw(self):
         screen = Game.Draw(self)
         surf_pgm = self.pg_font.render(self.program, False, (255,255,255))
         screen.blit(surf_pgm, (8,8))
         if self.current_output and len(self.current_output) > 1:
-            surf_out = self.pg_font.render(self.current_output[:len(self.desired_output)], False, (255,255,255))
+            surf_out = self.pg_font.render(self.current_output[:self.longest], False, (255,255,255))
             screen.blit(surf_out, (8,108))
         return screen
 
@@ -9,6 +9,14 @@ Object: To reach the right-hand side of the screen.
 
 import pygame
 import random
+from array import array
+from collections import deque
+
+# only needed to run a whole population at once
+try:
+	import numpy
+except ImportError:
+	numpy = None
 
 from skeleton_game import Game
 
@@ -20,14 +28,17 @@ player_color = (200,200,200)
 floor = 0
 wall = 1
 
-defaultargs = {	'seed':   1,
-				'screen': (100, 80) }
+defaultargs = {	'seed':      1,
+				'screen':    (100, 80),
+				'heuristic': 'horizontal' } # or 'exact', the true distance to the right side
 
-validargs = { 'screen':  lambda x: (len(x) == 2) and (x[0] > 0) and (x[1] > 0) }
+validargs = { 'screen':    lambda x: (len(x) == 2) and (x[0] > 0) and (x[1] > 0),
+			  'heuristic': ['horizontal', 'exact'] }
 
 # Maze game
 class Maze(Game):
 	name = 'maze'
+	snapshot = ('xpos', 'ypos')
 
 	def __init__(self, args = {}):
 		Game.__init__(self, args, defaultargs, validargs)
@@ -41,12 +52,9 @@ class Maze(Game):
 		xmax, ymax = self.args['screen']
 		self.w, self.h = (xmax, ymax)
 
-		# all wall tiles at first
-		self.world = [[wall for i in xrange(ymax)] for j in xrange(xmax)]
-
-		# generating the surface as we go along too
-		self.surf = pygame.Surface((xmax,ymax))
-		self.surf.fill(wall_color)
+		# all wall tiles at first.  world[y*w + x] is the tile at (x, y)
+		self.world = bytearray([wall]) * (xmax*ymax)
+		world = self.world
 
 		x, y = (1, ymax/2)              # start on left side in the middle
 
@@ -55,15 +63,17 @@ class Maze(Game):
 		self.ypos = y
 
 		# carve out the world
-		self.world[x][y]=floor                # place the floor tile, thereby demolishing the walls
-		self.surf.set_at((x,y), floor_color)  # do the same thing in the visual map
+		world[y*xmax + x] = floor       # place the floor tile, thereby demolishing the walls
 
 		# wander around until we hit the right side,
 		#  but leave a border of wall around the outside
+		rand = random.random
 		while x < xmax-1:
-			step = random.randint(0,1)*2 - 1
+			# int(rand()*2) is what random.randint(0,1) does under all its overhead,
+			#  so a given seed still makes the same maze
+			step = int(rand()*2)*2 - 1
 
-			if random.randint(0,1) == 1:
+			if int(rand()*2) == 1:
 				x+=step
 			else:
 				y+=step
@@ -75,23 +85,90 @@ class Maze(Game):
 			if x == 0: x=1
 			# we check for x out of the right side in the 'while' condition.
 
-			self.world[x][y] = floor
-			self.surf.set_at((x,y), floor_color)
-
+			world[y*xmax + x] = floor
 
+		# paint the visual map all at once, translating tiles into each color channel
+		pixels = bytearray(3*xmax*ymax)
+		for c in xrange(3):
+			channel = bytearray(256)
+			channel[floor] = floor_color[c]
+			channel[wall] = wall_color[c]
+			pixels[c::3] = world.translate(channel)
+		self.surf = pygame.Surface((xmax,ymax))
+		self.surf.blit(pygame.image.fromstring(str(pixels), (xmax,ymax), 'RGB'), (0,0))
+
+		# Draw keeps the player drawn into the map, moving it as needed
+		self.drawn = (self.xpos, self.ypos)
+		self.surf.set_at(self.drawn, player_color)
+
+		self._Distance = self._HorizontalDistance
+		if self.args['heuristic'] == 'exact':
+			self._MakeDistanceField()
+			self._Distance = self._ExactDistance
+
+		if numpy is not None:
+			self._MakeMoveTables()
+
+	# the number of moves from each tile to the right side, or -1 for walls and
+	# anywhere that can't get there, found by searching back from the right side.
+	# indexed like world.
+	def _MakeDistanceField(self):
+		w, h, world = (self.w, self.h, self.world)
+		dist = array('i', [-1]) * (w*h)
+		fringe = deque()
+		for y in xrange(h):
+			if world[y*w + w-1] == floor:
+				dist[y*w + w-1] = 0
+				fringe.append(y*w + w-1)
+		while fringe:
+			i = fringe.popleft()
+			d = dist[i] + 1
+			x = i % w
+			# the border is all wall, except on the right where there's nothing to the right
+			for j in (i-1, i-w, i+w) if x == w-1 else (i-1, i+1, i-w, i+w):
+				if world[j] == floor and dist[j] < 0:
+					dist[j] = d
+					fringe.append(j)
+		self.dist = dist
+
+	# numpy views of the world and distances, which share their memory rather than copying,
+	# and how far each input moves the player in x and y
+	def _MakeMoveTables(self):
+		self.np_world = numpy.frombuffer(self.world, numpy.uint8)
+		if self.args['heuristic'] == 'exact':
+			self.np_dist = numpy.frombuffer(self.dist, numpy.int32)
+		self.np_dx = numpy.zeros(16, numpy.intp)
+		self.np_dy = numpy.zeros(16, numpy.intp)
+		for n in xrange(1, 16):
+			if n & 0b0011: self.np_dy[n] = -1 if n & 0b0001 else 1
+			else:          self.np_dx[n] = -1 if n & 0b0100 else 1
+
+	# the map never changes, so only the player needs redrawing.
+	# this is the game's own surface, so it's only good until the next Draw.
 	def Draw(self):
-		ret = self.surf.copy()
-		ret.set_at((self.xpos, self.ypos), player_color)
-		return ret
+		pos = (self.xpos, self.ypos)
+		if pos != self.drawn:
+			self.surf.set_at(self.drawn, floor_color)
+			self.surf.set_at(pos, player_color)
+			self.drawn = pos
+		return self.surf
 
 	def Heuristic(self):
-		return self.w - self.xpos
+		return self._Distance(self.xpos, self.ypos)
 
-	def Input(self, n):
-		if n == 0:  return
+	def _HorizontalDistance(self, x, y):
+		return self.w - x
 
-		nx = self.xpos
-		ny = self.ypos
+	def _ExactDistance(self, x, y):
+		d = self.dist[y*self.w + x]
+		if d < 0:  return float('inf')
+		return d
+
+	# where input n takes the player from (x, y)
+	def _Move(self, x, y, n):
+		if n == 0:  return (x, y)
+
+		nx, ny = (x, y)
 		if n & 0b0011: # vertical
 			if n & 0b0001: ny -= 1 # up
 			else:          ny += 1 # down
@@ -100,9 +177,59 @@ class Maze(Game):
 			else:          nx += 1 # right
 
 		# if we didn't run into a wall or out of bounds, that's our new position
-		if nx < self.w and self.world[nx][ny] == floor:
-			self.xpos = nx
-			self.ypos = ny
+		if nx < self.w and self.world[ny*self.w + nx] == floor:
+			return (nx, ny)
+		return (x, y)
+
+	def Input(self, n):
+		self.xpos, self.ypos = self._Move(self.xpos, self.ypos, n)
+
+	def Push(self, n):
+		self.pushed.append( (self.xpos, self.ypos) )
+		self.xpos, self.ypos = self._Move(self.xpos, self.ypos, n)
+
+	def Pop(self):
+		self.xpos, self.ypos = self.pushed.pop()
+
+	# the state is just a position, so there's nothing to restore
+	def Expand(self, state, inputs):
+		x, y = state
+		children = []
+		for n in inputs:
+			cx, cy = self._Move(x, y, n)
+			children.append( ((cx, cy), self._Distance(cx, cy), cx >= self.w - 1, False) )
+		return children
+
+	# every agent takes its next step at once, so a population costs one pass
+	# of array operations per gene rather than one Input per agent per gene
+	def RunPopulation(self, state, dnas):
+		genes = None
+		if numpy is not None and len(dnas):
+			genes = numpy.array(dnas, numpy.intp)
+		if genes is None or genes.ndim != 2: # not all the same length
+			return Game.RunPopulation(self, state, dnas)
+
+		w, world, dx, dy = (self.w, self.np_world, self.np_dx, self.np_dy)
+		count, length = genes.shape
+		x = numpy.empty(count, numpy.intp);  x.fill(state[0])
+		y = numpy.empty(count, numpy.intp);  y.fill(state[1])
+		won = numpy.empty(count, numpy.intp);  won.fill(-1)
+		for step in xrange(length):
+			n = genes[:,step]
+			nx, ny = (x + dx[n], y + dy[n])
+			# like _Move, but agents that have already won stay put
+			ok = (won < 0) & (nx < w) & (world[ny*w + numpy.minimum(nx, w-1)] == floor)
+			x = numpy.where(ok, nx, x)
+			y = numpy.where(ok, ny, y)
+			won[(won < 0) & (x >= w-1)] = step + 1
+			if won.min() >= 0:  break
+
+		if self.args['heuristic'] == 'exact':
+			fitness = self.np_dist[y*w + x].astype(float)
+			fitness[fitness < 0] = float('inf')
+		else:
+			fitness = w - x
+		return zip(fitness.tolist(), won.tolist())
 
 	def HumanInputs(self):
 		return self.inputs
@@ -110,12 +237,6 @@ class Maze(Game):
 	def ValidInputs(self):
 		return self.inputs.values()
 
-	def Freeze(self):
-		return (self.xpos, self.ypos)
-
-	def Thaw(self, data):
-		self.xpos, self.ypos = data
-
 	def Victory(self):
 		return self.xpos >= self.w - 1
 
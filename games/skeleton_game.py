@@ -8,6 +8,7 @@ Darren Alton
 import pygame
 from cPickle import dumps, loads
 from array import array
+from operator import attrgetter
 
 xmax = 320 # fallback width of the screen
 ymax = 200 # fallback height of the screen
@@ -15,6 +16,21 @@ ymax = 200 # fallback height of the screen
 class Game:
 	name = 'unnamed game'
 
+	# the attributes that make up the game's state, as opposed to things like maps and
+	# fonts that never change.  if a game lists them here, Freeze and Thaw snapshot just
+	# those into a tuple (or the value itself, if there's only one) instead of pickling
+	# everything.  the values are shared, not copied, so they should be immutable.
+	snapshot = None
+
+	# whether the states Freeze returns are small enough for a brain to keep one for
+	# every node it has waiting (they are if the game declares snapshot).  if not,
+	# brains that can keep just the inputs that got there and replay them.
+	small_states = False
+
+	# args that only change how the game is searched, not what its inputs do.  runs are
+	# saved unrolled, so they replay the same with or without these.
+	search_args = ()
+
 	def __init__(self, args={}, defaultargs={}, validargs={}):
 		# try to convert args to appropriate types (from str)
 		for i in args:
@@ -51,7 +67,14 @@ class Game:
 		# otherwise, we're all good...
 		self.args = args
 
-	# return a copy of the "screen" for visualization
+		# what Pop needs to undo each Push
+		self.pushed = []
+
+		if self.snapshot is not None:
+			self._Snapshot = attrgetter(*self.snapshot)
+
+	# return a copy of the "screen" for visualization.  it's fine to return the same
+	# surface every time, so callers that want to keep or change it should copy it.
 	def Draw(self):
 		ret = pygame.surface.Surface((xmax, ymax))
 		ret.fill((0,123,45))
@@ -71,16 +94,88 @@ class Game:
 
 	# return some copy of the game's state
 	def Freeze(self):
-		return dumps(self.__dict__)
+		if self.snapshot is not None:
+			return self._Snapshot(self)
+		state = self.__dict__.copy()
+		del state['pushed']
+		return dumps(state)
 
 	# restore a saved state returned by Freeze
 	def Thaw(self, state):
+		if self.snapshot is not None:
+			if len(self.snapshot) == 1:
+				setattr(self, self.snapshot[0], state)
+			else:
+				self.__dict__.update(zip(self.snapshot, state))
+			return
+		pushed = self.pushed
 		self.__dict__ = loads(state)
+		self.pushed = pushed
+
+	# a small hashable fingerprint of a state returned by Freeze, the same for any two
+	# states the game can't tell apart.  brains keep these in their transposition tables
+	# rather than whole states.  small, hashable states can just be their own key.
+	def StateKey(self, state):
+		return state
 
 	# set the state of the "control pad" and run a frame
 	def Input(self, data):
 		pass
 
+	# run a frame in a way that Pop can undo.  Push/Pop pairs nest, so a depth-first
+	# search can walk the tree without freezing and thawing every node.
+	# games that can undo an input cheaply should override both.
+	def Push(self, data):
+		self.pushed.append(self.Freeze())
+		self.Input(data)
+
+	# undo the last Push
+	def Pop(self):
+		self.Thaw(self.pushed.pop())
+
+	# try each of inputs from state, returning (child_state, heuristic, victory, defeat)
+	# for each, in order.  the game is left in no particular state, so Thaw before going on.
+	# games that can work out children without a full Thaw and Input should override this.
+	def Expand(self, state, inputs):
+		children = []
+		for i in inputs:
+			self.Thaw(state)
+			self.Input(i)
+			children.append( (self.Freeze(), self.Heuristic(), self.Victory(), self.Defeat()) )
+		return children
+
+	# run each of dnas, a list of input sequences, from state, stopping any that win early.
+	# returns (fitness, victory step) for each, in order: the heuristic where it stopped, and
+	# how many inputs it took to win, or -1 if it didn't.  the game is left in no particular
+	# state.  games that can step a whole population at once should override this.
+	def RunPopulation(self, state, dnas):
+		results = []
+		for dna in dnas:
+			self.Thaw(state)
+			steps = -1
+			for i, n in enumerate(dna):
+				self.Input(n)
+				if self.Victory():
+					steps = i + 1
+					break
+			results.append( (self.Heuristic(), steps) )
+		return results
+
+	# turn a path of inputs from where the game started into the inputs a player would
+	# give, for saving and replaying.  games whose inputs stand for several at once
+	# (like sokoban's pushes) should override this.
+	def Unroll(self, path):
+		return path
+
+	# a dict of any numbers about a path (as Unroll gives it) worth reporting with a run
+	def PathStats(self, path):
+		return {}
+
+	# a dict of anything else the game found out during a run worth reporting with it,
+	# whether or not it was solved
+	def RunStats(self):
+		return {}
+
 	# must return an iterable of all possible inputs
 	def ValidInputs(self):
 		return [0]
@@ -28,29 +28,140 @@ wall = 1
 
 # roughly follows http://sokobano.de/wiki/index.php?title=Sok_format conventions
 # also, to please nethack players, ` can denote a box and ^ can denote a hole
-def _valid_mapfile(fname):
-    if os.path.isfile(fname):
-        x = open(fname, 'r').read()
-        if x.count('@') + x.count('+') + x.count('p') + x.count('P') != 1:
-            print "exactly one 'pusher' character must exist"
-            return False
-        if x.count('$') + x.count('b') + x.count('`') != x.count('.') + x.count('^'):
-            print "number of boxes does not match number of holes"
-            return False
-        if not frozenset(x).issubset(frozenset('#@+pP$*bB`.^ -_\n')):
-            print "invalid characters in map file.  please remove headers etc."
-            return False
-        return True
-    return False
-
-defaultargs = { 'map': 'data/wikipedia.org_wiki_Sokoban.txt' }
-validargs = { 'map': _valid_mapfile }
+map_chars = frozenset('#@+pP$*bB`.^ -_')
+
+# the levels in a map file, as (title, lines) pairs.  a file can be a single map, or a
+# whole collection (.sok, .xsb) with titles, comments and so on between the maps.
+# a level's title is taken from a 'Title:' line after it, or failing that from a
+# '; comment' line just before it, as .xsb files do.
+def read_levels(fname):
+    levels = [] # [title, comment before it, lines]
+    board, comment = ([], None)
+    for line in open(fname, 'r').read().splitlines() + ['']:
+        line = line.rstrip()
+        if line and '#' in line and frozenset(line) <= map_chars:
+            board.append(line)
+            continue
+        if board:
+            levels.append( [None, comment, board] )
+            board, comment = ([], None)
+        if line.lower().startswith('title:') and levels:
+            levels[-1][0] = line[len('title:'):].strip()
+        elif line.startswith(';'):
+            comment = line[1:].strip()
+        elif line:
+            comment = None
+    return [(title or comment or '', board) for title, comment, board in levels]
+
+# why a level can't be played, or None if it can
+def _level_problem(lines):
+    x = '\n'.join(lines)
+    if sum(x.count(i) for i in '@+pP') != 1:
+        return "exactly one 'pusher' character must exist"
+    if sum(x.count(i) for i in '$*bB`') != sum(x.count(i) for i in '.+P*B^'):
+        return "number of boxes does not match number of holes"
+    return None
 
-def manhattan_distance((x1, y1), (x2, y2)):
-    return abs(x1 - x2) + abs(y1 - y2)
+def _valid_mapfile(fname):
+    return os.path.isfile(fname) and len(read_levels(fname)) > 0
+
+defaultargs = { 'map':    'data/wikipedia.org_wiki_Sokoban.txt',
+                'level':  0,      # which level of the map file, by index or title
+                'pushes': False } # search box pushes rather than single steps
+validargs = { 'map':    _valid_mapfile,
+              'level':  lambda x: type(x) in (int, str),
+              'pushes': [True, False] }
+
+# the four single steps, and which way each goes
+directions = { 0b0001: (0, -1),
+               0b0010: (0, 1),
+               0b0100: (-1, 0),
+               0b1000: (1, 0) }
+
+# push distances that can't be made stand in as this, so every box has some cost
+# for every hole.  a matching that costs this much or more can't be done.
+unreachable = 1 << 20
+
+# the indices of the set bits in mask, lowest first
+def squares(mask):
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+# the cheapest way to assign boxes to holes, given what each box would cost at each
+# hole.  it keeps the dual potentials of the last assignment (the hungarian method),
+# so when only a few boxes have moved, just their rows need re-solving.
+class Matching:
+    def __init__(self, costs, n):
+        self.costs = costs # square -> cost of a box there at each hole
+        self.n = n
+        self.boxes = 0              # bitmask of squares, like Sokoban.boxes
+        self.rows = [None] * (n+1)  # the box's square in each row, counting from 1
+        self.row_of = {}            # box -> its row
+        self.u = [0] * (n+1)        # row potentials
+        self.v = [0] * (n+1)        # column (hole) potentials
+        self.p = [0] * (n+1)        # the row assigned to each column, 0 for none
+
+    # the cost of the cheapest assignment for boxes
+    def Update(self, boxes):
+        gone, new = (self.boxes & ~boxes, boxes & ~self.boxes)
+        if gone or new:
+            rows, gone = ([], list(squares(gone)))
+            for box in squares(new):
+                if gone:
+                    i = self.row_of.pop(gone.pop())
+                else:
+                    i = len(self.row_of) + 1 # the first time, every box needs a row
+                self.rows[i] = box
+                self.row_of[box] = i
+                rows.append(i)
+            for j in xrange(1, self.n+1):
+                if self.p[j] in rows:  self.p[j] = 0
+            for i in rows:
+                self._Augment(i)
+            self.boxes = boxes
+        costs, rows, p = (self.costs, self.rows, self.p)
+        return sum(costs[rows[p[j]]][j-1] for j in xrange(1, self.n+1))
+
+    # assign row i, shifting other rows along the cheapest augmenting path
+    def _Augment(self, i):
+        n, u, v, p = (self.n, self.u, self.v, self.p)
+        minv = [float('inf')] * (n+1)
+        used = [False] * (n+1)
+        way = [0] * (n+1)
+        p[0] = i
+        j0 = 0
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            cost, ui = (self.costs[self.rows[i0]], u[i0])
+            delta, j1 = (float('inf'), 0)
+            for j in xrange(1, n+1):
+                if not used[j]:
+                    cur = cost[j-1] - ui - v[j]
+                    if cur < minv[j]:
+                        minv[j] = cur
+                        way[j] = j0
+                    if minv[j] < delta:
+                        delta, j1 = (minv[j], j)
+            for j in xrange(n+1):
+                if used[j]:
+                    u[p[j]] += delta
+                    v[j] -= delta
+                else:
+                    minv[j] -= delta
+            j0 = j1
+            if p[j0] == 0:  break
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
 
 class Sokoban(Game):
     name = 'sokoban'
+    search_args = ('pushes',)
+    small_states = True
 
     def __init__(self, args = {}):
         Game.__init__(self, args, defaultargs, validargs)
@@ -61,7 +172,19 @@ class Sokoban(Game):
                         'hat0_right': 0b1000 }
 
         # parse map
-        lines = open(self.args['map'], 'r').read().strip('\n').split('\n')
+        levels = read_levels(self.args['map'])
+        level = self.args['level']
+        if type(level) is str:
+            titles = [title for title, lines in levels]
+            if level not in titles:
+                raise Exception('no level titled {!r} in {}'.format(level, self.args['map']))
+            level = titles.index(level)
+        if not 0 <= level < len(levels):
+            raise Exception('{} only has {} levels'.format(self.args['map'], len(levels)))
+        self.title, lines = levels[level]
+        problem = _level_problem(lines)
+        if problem is not None:
+            raise Exception('level {} of {}: {}'.format(level, self.args['map'], problem))
         self.w, self.h = (max(len(l) for l in lines), len(lines))
 
         # all floor tiles at first
@@ -72,8 +195,8 @@ class Sokoban(Game):
         self.surf = pygame.Surface((self.w, self.h))
         self.surf.fill(floor_color)
 
-        self.boxes = set()
-        self.holes = set()
+        boxes = set()
+        holes = set()
         for y in xrange(self.h):
             for x in xrange(len(lines[y])):
                 char = lines[y][x]
@@ -85,38 +208,68 @@ class Sokoban(Game):
                     self.xpos, self.ypos = xy
                 elif char in 'P+':
                     self.xpos, self.ypos = xy
-                    self.holes.add(xy)
+                    holes.add(xy)
                     self.surf.set_at(xy, hole_color)
                 elif char in 'b$`':
-                    self.boxes.add(xy)
+                    boxes.add(xy)
                 elif char in '.^':
-                    self.holes.add(xy)
+                    holes.add(xy)
                     self.surf.set_at(xy, hole_color)
                 elif char in 'B*':
-                    self.boxes.add(xy)
-                    self.holes.add(xy)
+                    boxes.add(xy)
+                    holes.add(xy)
                     self.surf.set_at(xy, hole_color)
 
+        # boxes and holes are bitmasks, where (x, y) is bit y*w + x.  they're
+        # much smaller to keep around than sets of tuples, and quick to hash.
+        self.bit = [1 << i for i in xrange(self.w * self.h)]
+        self.boxes = sum(self.bit[y*self.w + x] for x, y in boxes)
+        self.holes = sum(self.bit[y*self.w + x] for x, y in holes)
+
         # performance hack
-        for boxhole in self.boxes & self.holes:
+        for boxhole in boxes & holes:
             if self.TrappedBox(boxhole):
-                self.boxes.remove(boxhole)
-                self.holes.remove(boxhole)
                 x, y = boxhole
+                self.boxes ^= self.bit[y*self.w + x]
+                self.holes ^= self.bit[y*self.w + x]
                 self.world[x][y] = wall
                 self.surf.set_at(boxhole, boxhole_color)
 
-        self.holes = frozenset(self.holes)
+        self._MakePushDistances()
+        self._MakeMasks()
+        self.matching = Matching(self.push_dists, bin(self.holes).count('1'))
+
+        # in push mode, an input is a whole push: the box's square (y*w + x) shifted
+        # left 4 bits, or'd with the direction it's pushed in.  walking up to the box is
+        # left to Unroll, and states only keep which area the player is in, not where.
+        self.pushes = self.args['pushes']
+        self.start = (self.xpos, self.ypos, self.boxes)
 
+        # what Draw returns, and the (x, y, boxes) it was last drawn for
+        self.frame = self.surf.copy()
+        self.drawn = (self.xpos, self.ypos, 0)
+
+    # only the squares that have changed since the last Draw get drawn again: those where
+    # a box came or went, and where the player was and is.
+    # this is the game's own surface, so it's only good until the next Draw.
     def Draw(self):
-        ret = self.surf.copy()
-        ret.set_at((self.xpos, self.ypos), player_color)
-        for box in self.boxes:
-            if box in self.holes:
-                ret.set_at(box, boxhole_color)
-            else:
-                ret.set_at(box, box_color)
-        return ret
+        x, y, boxes = self.drawn
+        for i in squares(boxes ^ self.boxes):
+            self._DrawSquare(i)
+        self._DrawSquare(y*self.w + x)
+        self.frame.set_at((self.xpos, self.ypos), player_color)
+        self.drawn = (self.xpos, self.ypos, self.boxes)
+        return self.frame
+
+    # whatever is on square i, other than the player
+    def _DrawSquare(self, i):
+        xy = (i % self.w, i / self.w)
+        if not self.boxes & self.bit[i]:
+            self.frame.set_at(xy, self.surf.get_at(xy))
+        elif self.holes & self.bit[i]:
+            self.frame.set_at(xy, boxhole_color)
+        else:
+            self.frame.set_at(xy, box_color)
 
     def TrappedBox(self, (x, y)):
         # check walls (if blocked by one wall in each direction, can't move)
@@ -140,26 +293,106 @@ class Sokoban(Game):
         return (N and ((NW and W) or (NE and E))) \
             or (S and ((SW and W) or (SE and E)))
 
+    # the squares a box can't be on without the level being lost, and the rest of what
+    # _Trapped needs to test every box at once.  needs the push distances.
+    def _MakeMasks(self):
+        w, h = (self.w, self.h)
+        inner = [(x, y) for x in xrange(1, w-1) for y in xrange(1, h-1)]
+        self.walls = sum(self.bit[y*w + x] for x in xrange(w) for y in xrange(h) if self.world[x][y] != floor)
+        self.border = sum(self.bit[y*w + x] for x in xrange(w) for y in xrange(h)) & ~sum(self.bit[y*w + x] for x, y in inner)
+        # floor that no box can be pushed from to any hole: corners, along walls with no
+        # hole on them, and the like.  holes are always at distance 0, so never dead.
+        self.dead = sum(self.bit[i] for i in xrange(w*h)
+                        if not self.walls & self.bit[i] and min(self.push_dists[i]) >= unreachable)
+
+    # true if any box not in a hole is stuck for good.  a box on a dead square is, and so
+    # is one that's frozen: it can't be pushed either way along either axis.  the boxes
+    # that might be frozen are found all at once, by shifting the whole board to see which
+    # have something in the way (or dead squares both sides) along both axes, and only
+    # those get the full check.  boxes on the edge of the map are left to TrappedBox.
+    def _Trapped(self, boxes):
+        loose = boxes & ~self.holes
+        if loose & self.dead:
+            return True
+        w, dead = (self.w, self.dead)
+        occupied = self.walls | boxes
+        across = (occupied << 1) | (occupied >> 1) | ((dead << 1) & (dead >> 1))
+        down = (occupied << w) | (occupied >> w) | ((dead << w) & (dead >> w))
+        for i in squares(loose & across & down & ~self.border):
+            if self._Frozen(i, boxes, self.walls):
+                return True
+        return any(self.TrappedBox((i % w, i / w)) for i in squares(loose & self.border))
+
+    # true if the box at i can never move.  along each axis, it's stuck if there's a
+    # wall either side, dead squares both sides, or a box either side that's frozen
+    # itself, counting this one as a wall so the boxes can't prop each other up forever.
+    def _Frozen(self, i, boxes, walls):
+        bit, dead = (self.bit, self.dead)
+        if self.border & bit[i]:
+            return False
+        walls |= bit[i]
+        for step in (1, self.w):
+            a, b = (i - step, i + step)
+            if walls & (bit[a] | bit[b]):
+                continue
+            if dead & bit[a] and dead & bit[b]:
+                continue
+            if boxes & bit[a] and self._Frozen(a, boxes, walls):
+                continue
+            if boxes & bit[b] and self._Frozen(b, boxes, walls):
+                continue
+            return False
+        return True
+
+    # how many pushes it takes to get a box from each square to each hole, if nothing
+    # else were in the way.  found by pulling a box back from each hole, which needs
+    # floor both where the box goes and where the player backs into.
+    # indexed by square, like the bitmasks.
+    def _MakePushDistances(self):
+        tables = []
+        for i in squares(self.holes):
+            hole = (i % self.w, i / self.w)
+            dist = { hole: 0 }
+            fringe = [hole]
+            for x, y in fringe:
+                for dx, dy in directions.itervalues():
+                    bx, by = (x - dx, y - dy)
+                    if (bx, by) not in dist and self._Floor(bx, by) and self._Floor(bx - dx, by - dy):
+                        dist[(bx, by)] = dist[(x, y)] + 1
+                        fringe.append((bx, by))
+            tables.append(dist)
+        self.push_dists = [tuple(t.get((i % self.w, i / self.w), unreachable) for t in tables)
+                           for i in xrange(self.w * self.h)]
+
+    def _Floor(self, x, y):
+        return 0 <= x < self.w and 0 <= y < self.h and self.world[x][y] == floor
+
+    # the fewest pushes that could get every box into a hole, each into its own
     def Heuristic(self):
-        if any(self.TrappedBox(box) for box in (self.boxes - self.holes)):
+        if self._Trapped(self.boxes):
             return float('inf')
-        return max(
-            sum(min(manhattan_distance(hole, box) for box in self.boxes) for hole in self.holes),
-            sum(min(manhattan_distance(box, hole) for hole in self.holes) for box in self.boxes)
-        )
+        h = self.matching.Update(self.boxes)
+        if h >= unreachable:
+            return float('inf')
+        return h
 
     def EmptySquare(self, x, y):
         "True iff (x, y) is in-bounds and a valid position for a man or a box"
         return 0 <= x < self.w and 0 <= y < self.h \
-            and self.world[x][y] == floor and (x, y) not in self.boxes
+            and self.world[x][y] == floor and not self.boxes & self.bit[y*self.w + x]
 
-    def Input(self, n):
-        if n == 0:  return
+    def HasBox(self, x, y):
+        "True iff there's a box at (x, y)"
+        return 0 <= x < self.w and 0 <= y < self.h and bool(self.boxes & self.bit[y*self.w + x])
 
-        nx, ny = (self.xpos, self.ypos) # new player position
-        px, py = (self.xpos, self.ypos) # pushed block position, if applicable
+    # where input n would take the player from (x, y), and a block in the way
+    def _Step(self, x, y, n):
+        nx, ny = (x, y) # new player position
+        px, py = (x, y) # pushed block position, if applicable
 
-        if n & 0b0011: # vertical
+        if n == 0:
+            pass
+        elif n & 0b0011: # vertical
             if n & 0b0001: # up
                 ny -= 1
                 py -= 2
@@ -174,28 +407,188 @@ class Sokoban(Game):
                 nx += 1
                 px += 2
 
-        if (nx, ny) in self.boxes and self.EmptySquare(px, py):
+        return (nx, ny, px, py)
+
+    # every square the player can walk to from (x, y) without pushing anything,
+    # each mapped to the (square, step) it's reached from
+    def _Reachable(self, x, y):
+        reached = { (x, y): None }
+        fringe = [(x, y)]
+        for x, y in fringe:
+            for n, (dx, dy) in directions.iteritems():
+                nx, ny = (x + dx, y + dy)
+                if (nx, ny) not in reached and self.EmptySquare(nx, ny):
+                    reached[(nx, ny)] = ((x, y), n)
+                    fringe.append((nx, ny))
+        return reached
+
+    # the top-left square the player could walk to, which stands for all of them
+    def _Normalize(self, x, y):
+        return min(self._Reachable(x, y), key=lambda (x, y): (y, x))
+
+    # the steps that walk the player from (x, y) to goal, or None if it can't be reached
+    def _Walk(self, x, y, goal):
+        reached = self._Reachable(x, y)
+        if goal not in reached:  return None
+        steps = []
+        while reached[goal] is not None:
+            goal, n = reached[goal]
+            steps.append(n)
+        steps.reverse()
+        return steps
+
+    # the pushes the player can get to from here
+    def _Pushes(self):
+        pushes = []
+        for (x, y) in self._Reachable(self.xpos, self.ypos):
+            for n, (dx, dy) in directions.iteritems():
+                bx, by = (x + dx, y + dy)
+                if self.HasBox(bx, by) and self.EmptySquare(bx + dx, by + dy):
+                    pushes.append( ((by*self.w + bx) << 4) | n )
+        return pushes
+
+    # the single steps push n stands for from (x, y): walking up to the box, then pushing it
+    def _PushSteps(self, x, y, n):
+        d = n & 0b1111
+        dx, dy = directions[d]
+        bx, by = ((n >> 4) % self.w, (n >> 4) / self.w)
+        if not self.HasBox(bx, by) or not self.EmptySquare(bx + dx, by + dy):
+            return None
+        steps = self._Walk(x, y, (bx - dx, by - dy))
+        if steps is None:  return None
+        return steps + [d]
+
+    def Input(self, n):
+        self._Apply(n)
+
+    # make move n, returning the bits of where the block it pushed was and went, if any
+    def _Apply(self, n):
+        if n == 0:  return 0
+
+        # a push in push mode: the player walks round to the box first
+        if n > 0b1111:
+            if self._PushSteps(self.xpos, self.ypos, n) is None:  return 0
+            box = n >> 4
+            n &= 0b1111
+            dx, dy = directions[n]
+            self.xpos, self.ypos = (box % self.w - dx, box / self.w - dy)
+
+        nx, ny, px, py = self._Step(self.xpos, self.ypos, n)
+
+        # the player only ever stands inside the map, so a box next to them is too
+        if not 0 <= nx < self.w or not 0 <= ny < self.h or self.world[nx][ny] != floor:
+            return 0
+        box = self.bit[ny*self.w + nx]
+        if not self.boxes & box:
             self.xpos = nx
             self.ypos = ny
-            self.boxes.remove((nx, ny))
-            self.boxes.add((px, py))
-        # if we didn't run into a wall or out of bounds, that's our new position
-        elif self.EmptySquare(nx, ny):
+        elif self.EmptySquare(px, py):
             self.xpos = nx
             self.ypos = ny
+            moved = box | self.bit[py*self.w + px]
+            self.boxes ^= moved
+            return moved
+        return 0
+
+    # a move shifts at most one block, so it's cheap to undo
+    def Push(self, n):
+        x, y = (self.xpos, self.ypos)
+        self.pushed.append( (x, y, self._Apply(n)) )
+
+    def Pop(self):
+        self.xpos, self.ypos, moved = self.pushed.pop()
+        self.boxes ^= moved
+
+    # only moves that push a block need a new heuristic, the rest share the parent's.
+    def Expand(self, state, inputs):
+        if self.pushes:
+            return self._ExpandPushes(state, inputs)
+        x, y, boxes = state
+        w, bit = (self.w, self.bit)
+        children = []
+        parent = None
+        for n in inputs:
+            self.boxes = boxes
+            nx, ny, px, py = self._Step(x, y, n)
+
+            if self.HasBox(nx, ny) and self.EmptySquare(px, py):
+                self.boxes = boxes ^ bit[ny*w + nx] ^ bit[py*w + px]
+                h = self.Heuristic()
+                children.append( ((nx, ny, self.boxes), h, self.boxes == self.holes, h == float('inf')) )
+                continue
+
+            if parent is None:
+                h = self.Heuristic()
+                parent = (h, boxes == self.holes, h == float('inf'))
+            child = state
+            if self.EmptySquare(nx, ny):
+                child = (nx, ny, boxes)
+            children.append( (child,) + parent )
+
+        self.Thaw(state)
+        return children
+
+    # in push mode every child moves a box, and the player ends up where the box was
+    def _ExpandPushes(self, state, inputs):
+        x, y, boxes = state
+        children = []
+        for n in inputs:
+            dx, dy = directions[n & 0b1111]
+            box = n >> 4
+            bx, by = (box % self.w, box / self.w)
+            self.boxes = boxes ^ self.bit[box] ^ self.bit[box + dy*self.w + dx]
+            h = self.Heuristic()
+            nx, ny = self._Normalize(bx, by)
+            children.append( ((nx, ny, self.boxes), h, self.boxes == self.holes, h == float('inf')) )
+
+        self.Thaw(state)
+        return children
+
+    # replay a path from the start, turning each push into the steps it stands for
+    def Unroll(self, path):
+        if not self.pushes or path is None:  return path
+        here = (self.xpos, self.ypos, self.boxes)
+        self.Thaw(self.start)
+        steps = []
+        for n in path:
+            if n > 0b1111:
+                steps += self._PushSteps(self.xpos, self.ypos, n) or []
+            else:
+                steps.append(n)
+            self._Apply(n)
+        self.Thaw(here)
+        return steps
+
+    # how many of a path's steps moved the player, and how many of those pushed a box
+    def PathStats(self, path):
+        here = (self.xpos, self.ypos, self.boxes)
+        self.Thaw(self.start)
+        moves, pushes = (0, 0)
+        for n in path:
+            x, y = (self.xpos, self.ypos)
+            if self._Apply(n):
+                pushes += 1
+            if (x, y) != (self.xpos, self.ypos):
+                moves += 1
+        self.Thaw(here)
+        return { 'moves': moves, 'pushes': pushes }
 
     def HumanInputs(self):
         return self.inputs
 
     def ValidInputs(self):
+        if self.pushes:  return self._Pushes()
         return self.inputs.values()
 
+    # in push mode, any square the player could walk to is as good as any other
     def Freeze(self):
-        return (self.xpos, self.ypos, frozenset(self.boxes))
+        if self.pushes:
+            x, y = self._Normalize(self.xpos, self.ypos)
+            return (x, y, self.boxes)
+        return (self.xpos, self.ypos, self.boxes)
 
     def Thaw(self, data):
         self.xpos, self.ypos, self.boxes = data
-        self.boxes = set(self.boxes)
 
     def Victory(self):
         return self.boxes == self.holes
@@ -23,6 +23,7 @@ siminp = retro.simple_input
 
 from array import array
 from ctypes import string_at
+from hashlib import md5
 
 # for argument validation
 def has_repeats(s):
@@ -50,7 +51,7 @@ validargs = { 'libretro':    os.path.isfile,
 			  'tweening':    lambda x: x >= 0,
 			  'inputmask':   lambda x: set(x).issubset('BY?!^v<>AXLR') and not has_repeats(x),
 			  'audio':       ['none', 'pygame'], # 'wave' and 'array' currently unsupported by cy_retro
-			  'heuristic':   list(util.ListModules('heuristics')) }
+			  'heuristic':   list(util.ListHeuristics()) }
 
 class SnesPadDrawing:
 	def __init__(self, alpha=255, name='SUPER NES'):
@@ -186,6 +187,18 @@ class SuperOpti(Game):
 		self.soundbuf = array('H', [])
 		self.pad = 0
 
+		# the last state we froze or thawed, if the emulator is still in it
+		self.thawed = None
+
+		# where the work RAM sits in a savestate, so StateKey can fingerprint just that.
+		# libretro doesn't give us the CPU registers, but between frames WRAM says it all.
+		self.wram_at = None
+		wram = self.emu._memory_to_string(core.MEMORY_WRAM)
+		if wram:
+			self.wram_size = len(wram)
+			self.wram_at = self.emu.serialize().find(wram)
+			if self.wram_at < 0:  self.wram_at = None
+
 		self._Heuristic = None
 		try:
 			sys.path.append('./heuristics')
@@ -250,10 +263,15 @@ class SuperOpti(Game):
 
 	def Freeze(self):
 		if self.keyframe is not None:
-			return (self.keyframe, self.inputs_since_keyframe[:])
-		return self.emu.serialize()
+			self.thawed = (self.keyframe, self.inputs_since_keyframe[:])
+		else:
+			self.thawed = self.emu.serialize()
+		return self.thawed
 
 	def Thaw(self, state):
+		# unserializing isn't cheap, so don't do it to get where we already are
+		if state is self.thawed:  return
+
 		if type(state) == tuple:
 			realstate,instring = state
 			tweens = len(self.inputs_since_keyframe)
@@ -273,6 +291,26 @@ class SuperOpti(Game):
 				self.inputs_since_keyframe = []
 
 		self.wram = self.emu._memory_to_string(core.MEMORY_WRAM)
+		self.thawed = state
+
+	# savestates are hundreds of KB, so don't make anyone hash or compare them whole
+	def StateKey(self, state):
+		if type(state) == tuple:
+			keyframe, instring = state
+			return (self.StateKey(keyframe), tuple(instring))
+		if self.wram_at is None:
+			return md5(state).digest()
+		return md5(buffer(state, self.wram_at, self.wram_size)).digest()
+
+	# try each input from the same state, working out the heuristic only once for each
+	def Expand(self, state, inputs):
+		children = []
+		for i in inputs:
+			self.Thaw(state)
+			self.Input(i)
+			h = self.Heuristic()
+			children.append( (self.Freeze(), h, h <= 0, h == float('inf')) )
+		return children
 
 	# only convert the screen from 16-bit format to RGB888 when we need it
 	def Draw(self):
@@ -295,6 +333,7 @@ class SuperOpti(Game):
 	def Input(self, pad):
 		# update the internal pad state that will be checked with libretro' callbacks
 		self.pad = pad
+		self.thawed = None
 		siminp.set_state_digital(0, pad)
 
 		# run for the specified number of frames on that pad state
@@ -173,6 +173,8 @@ class OptinessModulePicker(gtk.VBox):
 			self.remove(i)
 
 		self.mod = widget.get_active_text()
+		self.combo.set_tooltip_text(common.util.Describe(self.mod))
+		# only the module actually picked gets imported, if even that
 		self.args, self.validators = common.util.GetArgs(self.mod)
 		for i in self.args:
 			self.pack_start( OptinessArgEntry(self, i, self.args, self.validators), expand=False )
@@ -193,7 +195,7 @@ class OptinessGUI(gtk.Window):
 		button.connect('clicked', self.clicked_cb)
 
 		self.savefile = gtk.Entry()
-		self.savefile.set_text('output/last_run.pickle')
+		self.savefile.set_text('output/last_run.run')
 		hbox_output = gtk.HBox(spacing=4)
 		hbox_output.pack_start(gtk.Label('output'), expand=False)
 		hbox_output.pack_start(self.savefile)
@@ -235,11 +237,11 @@ saving to {}
 
 if __name__ == "__main__":
 	driver = None
-	output = 'data/last_run.pickle'
+	output = 'data/last_run.run'
 	w = OptinessGUI()
 	w.show_all()
 	gtk.main()
 
 	if driver is not None:
-		driver.Run()
+		driver.Run(stream=output)
 		driver.Save(output)
@@ -0,0 +1,100 @@
+#!/usr/bin/env python2
+
+"""
+Checks that Game's snapshot Freeze/Thaw (and the Push/Pop built on them) behave
+just like the pickle path it stands in for.  Each game is run twice over the same
+random inputs, Thaws and nested Push/Pops: once declaring its state fields in
+snapshot, and once pickling everything.  Run from the Optiness dir.
+"""
+
+import sys, os, random
+from cPickle import dumps
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+sys.path.append('./games')
+
+from skeleton_game import Game
+from maze import Maze
+from sokoban import Sokoban
+
+# the games as they'd be with nothing but snapshot: Game's Freeze, Thaw, Push and Pop
+def Snapshotted(base, fields):
+	class SnapshotGame(base):
+		snapshot = fields
+		Freeze, Thaw, Push, Pop = (Game.Freeze.im_func, Game.Thaw.im_func, Game.Push.im_func, Game.Pop.im_func)
+	return SnapshotGame
+
+# the games as they'd be pickling everything.  the bits that can't be pickled (maze's
+# drawing surface, bound methods) are set up once and never change, so they're set
+# aside around each Freeze and Thaw the way Game sets aside pushed
+def Pickled(base, fields):
+	class PickledGame(base):
+		snapshot = None
+		Push, Pop = (Game.Push.im_func, Game.Pop.im_func)
+		def __init__(self, args):
+			base.__init__(self, args)
+			self.fixed = []
+			for k, v in self.__dict__.items():
+				try:
+					dumps(v)
+				except Exception:
+					self.fixed.append(k)
+			assert not set(self.fixed) & set(fields)
+		def Freeze(self):
+			kept = dict((k, self.__dict__.pop(k)) for k in self.fixed)
+			try:
+				return Game.Freeze(self)
+			finally:
+				self.__dict__.update(kept)
+		def Thaw(self, state):
+			kept = dict((k, self.__dict__[k]) for k in self.fixed)
+			Game.Thaw(self, state)
+			self.__dict__.update(kept)
+	return PickledGame
+
+games = [ (Maze,      ('xpos', 'ypos'),                                      {'screen': '(40,30)'}),
+          (Maze,      ('xpos', 'ypos'),                                      {'screen': '(40,30)', 'heuristic': "'exact'"}),
+          (Sokoban,   ('xpos', 'ypos', 'boxes'),                             {}),
+          (Sokoban,   ('xpos', 'ypos', 'boxes'),                             {'pushes': '1'}) ]
+
+def Observe(game, fields):
+	return ( tuple(getattr(game, i) for i in fields),
+	         game.Heuristic(), game.Victory(), game.Defeat() )
+
+def Check(base, fields, args, steps, seed):
+	snap = Snapshotted(base, fields)(dict(args))
+	pick = Pickled(base, fields)(dict(args))
+	inputs = snap.ValidInputs()
+	rand = random.Random(seed)
+	saved = [ (snap.Freeze(), pick.Freeze()) ]
+	depth = 0
+	for step in xrange(steps):
+		r = rand.random()
+		if r < 0.1:
+			s, p = rand.choice(saved)
+			snap.Thaw(s)
+			pick.Thaw(p)
+			depth = 0
+			snap.pushed, pick.pushed = ([], [])
+		elif r < 0.15:
+			saved.append( (snap.Freeze(), pick.Freeze()) )
+		elif r < 0.55:
+			n = rand.choice(inputs)
+			snap.Push(n)
+			pick.Push(n)
+			depth += 1
+		elif r < 0.75 and depth:
+			snap.Pop()
+			pick.Pop()
+			depth -= 1
+		else:
+			n = rand.choice(inputs)
+			snap.Input(n)
+			pick.Input(n)
+		if Observe(snap, fields) != Observe(pick, fields):
+			raise Exception('{} {} differs after step {}'.format(base.__name__, args, step))
+	print '{:10} {:45} ok'.format(base.__name__, args)
+
+if __name__ == "__main__":
+	for base, fields, args in games:
+		for seed in xrange(5):
+			Check(base, fields, args, 2000, seed)
@@ -1,8 +1,12 @@
-from sys import argv
-from cPickle import load
+from sys import argv, path
+from os.path import dirname, join
+
+# works on run files as well as old pickles
+path.append(join(dirname(__file__), '..'))
+from runfile import Load
 
 def show_data(p, keys=[]):
-	if type(p) == dict:
+	if type(p) == dict or hasattr(p, 'keys'):
 		if len(keys):
 			if len(keys) == 1 and keys[0] == '.':
 				print '{', '\n  '.join([ '{}:\t{}'.format(i, repr(p[i])) for i in p ]), '}'
@@ -14,4 +18,4 @@ def show_data(p, keys=[]):
 		print p
 
 if __name__ == "__main__" and len(argv) > 1:
-	show_data( load( open(argv[1]) ), argv[2:] )
+	show_data( Load(argv[1]), argv[2:] )
@@ -0,0 +1,179 @@
+#!/usr/bin/env python2
+
+"""
+Optiness run files: the result of a run, in a form that can be written
+while the search is still going and read without loading all of it.
+
+A run file is the magic number 'OPTR' followed by chunks, each of which
+is a 4-byte tag, a little-endian uint32 length, and that many bytes:
+  HEAD  pickled dict of game, game_args, brain, brain_args
+  INPT  inputs, as little-endian uint16s (may appear many times, in order)
+  INPS  same, but the inputs are 1-character strings (e.g. brainfuck opcodes)
+  INFO  pickled dict of stats about the run (optional)
+  STAT  zlib-compressed pickle of the final game state (optional)
+
+Old results that are just a pickled dict can still be read with Load.
+"""
+
+import cPickle, zlib
+import mmap, struct, sys
+from array import array
+from bisect import bisect_right
+
+magic = 'OPTR'
+chunk_header = struct.Struct('<4sI')
+input_struct = struct.Struct('<H')
+
+
+# results are saved as run files if they're named like one, and pickled otherwise
+def IsRunFile(filename):
+	return filename.endswith('.run')
+
+
+# open either kind of result file.  both can be indexed with 'game', 'path', 'state' etc.
+def Load(filename):
+	f = open(filename, 'rb')
+	is_runfile = (f.read(len(magic)) == magic)
+	f.close()
+	if is_runfile:
+		return RunFile(filename)
+	return cPickle.load(open(filename, 'rb'))
+
+
+# pack a list of inputs into the payload of an INPT or INPS chunk
+def _PackInputs(inputs):
+	tag = 'INPT'
+	if len(inputs) and type(inputs[0]) is str:
+		tag = 'INPS'
+		inputs = [ord(i) for i in inputs]
+	try:
+		packed = array('H', inputs)
+	except (TypeError, OverflowError):
+		raise ValueError('run files can only hold inputs that fit in 16 bits. use a .pickle instead')
+	if sys.byteorder == 'big':
+		packed.byteswap()
+	return tag, packed.tostring()
+
+
+class RunWriter:
+	def __init__(self, filename, header):
+		self.filename = filename
+		self.f = open(filename, 'wb')
+		self.f.write(magic)
+		self._Chunk('HEAD', cPickle.dumps(header, 2))
+		self.count = 0
+
+	def _Chunk(self, tag, data):
+		self.f.write(chunk_header.pack(tag, len(data)))
+		self.f.write(data)
+
+	# add more inputs to the end of the path, flushing them to disk right away
+	def Append(self, inputs):
+		if not len(inputs):  return
+		self._Chunk(*_PackInputs(inputs))
+		self.f.flush()
+		self.count += len(inputs)
+
+	def Finish(self, state=None, info=None):
+		if info is not None:
+			self._Chunk('INFO', cPickle.dumps(info, 2))
+		if state is not None:
+			self._Chunk('STAT', zlib.compress(cPickle.dumps(state, 2)))
+		self.f.close()
+
+
+# the inputs of a run file, read straight from the file as they're needed
+class InputArray:
+	def __init__(self, buf, spans, chars):
+		self.buf = buf
+		self.spans = spans # (offset in file, number of inputs) of each chunk
+		self.chars = chars
+		# the index of the first input in each chunk, so finding one's chunk is a bisect
+		self.starts = []
+		self.length = 0
+		for ofs, n in spans:
+			self.starts.append(self.length)
+			self.length += n
+
+	def __len__(self):
+		return self.length
+
+	def __getitem__(self, i):
+		if type(i) is slice:
+			return [self[j] for j in xrange(*i.indices(self.length))]
+		if i < 0:  i += self.length
+		if not 0 <= i < self.length:
+			raise IndexError('input index out of range')
+		chunk = bisect_right(self.starts, i) - 1
+		x = input_struct.unpack_from(self.buf, self.spans[chunk][0] + 2*(i - self.starts[chunk]))[0]
+		if self.chars:  return chr(x)
+		return x
+
+	def __iter__(self):
+		for ofs, n in self.spans:
+			for i in xrange(n):
+				x = input_struct.unpack_from(self.buf, ofs + 2*i)[0]
+				if self.chars:  yield chr(x)
+				else:           yield x
+
+	def __repr__(self):
+		return repr(list(self))
+
+
+class RunFile:
+	def __init__(self, filename):
+		self.f = open(filename, 'rb')
+		self.buf = mmap.mmap(self.f.fileno(), 0, access=mmap.ACCESS_READ)
+		if self.buf[:len(magic)] != magic:
+			raise Exception('not an Optiness run file: ' + filename)
+
+		# find where everything is without reading any of it yet
+		self.chunks = {}
+		spans, chars = ([], False)
+		ofs = len(magic)
+		while ofs + chunk_header.size <= len(self.buf):
+			tag, length = chunk_header.unpack_from(self.buf, ofs)
+			ofs += chunk_header.size
+			if ofs + length > len(self.buf):
+				break # cut off while being written, ignore the partial chunk
+			if tag in ('INPT', 'INPS'):
+				spans.append( (ofs, length / 2) )
+				chars = (tag == 'INPS')
+			else:
+				self.chunks[tag] = (ofs, length)
+			ofs += length
+
+		self.header = self._Unpickle('HEAD')
+		self.path = InputArray(self.buf, spans, chars)
+		self.state = None
+
+	def _Read(self, tag):
+		ofs, length = self.chunks[tag]
+		return self.buf[ofs:ofs+length]
+
+	def _Unpickle(self, tag):
+		if tag not in self.chunks:  return None
+		return cPickle.loads(self._Read(tag))
+
+	def State(self):
+		if self.state is None and 'STAT' in self.chunks:
+			self.state = cPickle.loads(zlib.decompress(self._Read('STAT')))
+		return self.state
+
+	def keys(self):
+		keys = self.header.keys() + ['path']
+		if 'INFO' in self.chunks:  keys.append('stats')
+		if 'STAT' in self.chunks:  keys.append('state')
+		return keys
+
+	def __iter__(self):
+		return iter(self.keys())
+
+	def __contains__(self, key):
+		return key in self.keys()
+
+	def __getitem__(self, key):
+		if key == 'path':   return self.path
+		if key == 'state':  return self.State()
+		if key == 'stats':  return self._Unpickle('INFO')
+		return self.header[key]
@@ -0,0 +1,198 @@
+#!/usr/bin/env python2
+
+"""
+Optiness parameter sweeps
+
+Runs every combination of the given games, brains and argument values
+headless in a pool of worker processes, and collects how each run went
+into one tab-separated results table.
+"""
+
+import sys, os, getopt, time
+import itertools, multiprocessing, traceback
+
+# Optiness driver, which handles game and brain modules
+import common
+
+jobs = None                       # number of worker processes (default: one per cpu)
+timelimit = None                  # seconds each run may take
+nodelimit = None                  # nodes (states searched) each run may search
+output = 'output/sweep.tsv'       # default value for the results table
+logdir = None                     # per-run logs, if you want them
+profile = False                   # count calls to the game's primitives
+
+columns = ['id', 'game', 'game_args', 'brain', 'brain_args',
+           'solved', 'pathlen', 'time', 'frames', 'nodes', 'error']
+
+
+
+def usage():
+	return """
+usage: sweep.py -g GAME -b BRAIN [-g GAME ...] [-b BRAIN ...] [options]
+
+GAME and BRAIN are given like in console.py, except that each argument may
+list several values separated by '|', and N..M stands for every whole number
+from N to M.  every combination is run, e.g.
+  sweep.py -g maze@seed:1|2|3 -b wario@step:1|2@peek:0|1 -b sagan -t 60
+  sweep.py -g sokoban@map:data/optiness.xsb@level:0..3 -b sagan -t 60 -c moves -c pushes
+
+options:
+  -j, --jobs N       number of worker processes (default: one per cpu)
+  -t, --time SEC     give up on each run after this many seconds
+  -n, --nodes N      give up on each run after this many nodes (implies -p)
+  -o, --output FILE  where to write the results table ({})
+  -l, --logdir DIR   keep each run's output in DIR/<id>.log
+  -p, --profile      profile each run's game, and count nodes (states searched)
+  -c, --column KEY   also report this from each run's stats, if the game gives it
+                     (e.g. sokoban's moves and pushes; may be given more than once)
+""".format(output)
+
+
+# '3..5' -> ['3', '4', '5'].  anything else is left alone
+def ExpandRange(val):
+	try:
+		first, last = [int(i) for i in val.split('..')]
+	except ValueError:
+		return [val]
+	return [str(i) for i in xrange(first, last+1)]
+
+
+# 'wario@step:1|2@peek:0|1' -> [('wario', {'step':'1', 'peek':'0'}), ('wario', {'step':'1', 'peek':'1'}), ...]
+def ExpandSpec(spec):
+	subargs = spec.split('@')
+	name = subargs[0]
+	keys, values = ([], [])
+	for i in subargs[1:]:
+		key,val = i.split(':', 1)
+		keys.append(key)
+		values.append([j for v in val.split('|') for j in ExpandRange(v)])
+	for combo in itertools.product(*values):
+		yield (name, dict(zip(keys, combo)))
+
+
+def ExpandSweep(game_specs, brain_specs):
+	games = [g for spec in game_specs for g in ExpandSpec(spec)]
+	brains = [b for spec in brain_specs for b in ExpandSpec(spec)]
+	for (g, ga), (b, ba) in itertools.product(games, brains):
+		yield (g, ga, b, ba)
+
+
+# catch typos before spending hours on a sweep, without importing every module involved
+def CheckSweep(sweep):
+	ok = True
+	known = { 'game': list(common.util.ListGames()), 'brain': list(common.util.ListBrains()) }
+	for g, ga, b, ba in sweep:
+		for kind, name, args in (('game', g, ga), ('brain', b, ba)):
+			if name not in known[kind]:
+				print 'Sweep: no such {} module: {}'.format(kind, name)
+				ok = False
+				continue
+			defaults = common.util.ModuleInfo(name)['defaultargs']
+			if defaults is not None:
+				for key in args:
+					if key not in defaults:
+						print 'Sweep: warning: {} has no argument "{}"'.format(name, key)
+	return ok
+
+
+def FormatRow(row):
+	return '\t'.join(str(row.get(i, '')) for i in columns)
+
+
+# runs in a worker process.  never raises, so one bad run can't take down the sweep.
+def RunJob(job):
+	n, (g, ga, b, ba), timelimit, nodelimit, logdir, profile = job
+	row = { 'id': n, 'game': g, 'game_args': ga, 'brain': b, 'brain_args': ba }
+
+	# brains like to print a lot, so keep that out of the way
+	stdout = sys.stdout
+	if logdir is not None:
+		sys.stdout = open(os.path.join(logdir, '{}.log'.format(n)), 'w')
+	else:
+		sys.stdout = open(os.devnull, 'w')
+
+	try:
+		# the driver fills in defaults in place, so give it copies
+		driver = common.Driver(g, b, ga.copy(), ba.copy(), headless=True, profile=profile)
+		driver.Run(timelimit, nodelimit=nodelimit)
+		row.update(driver.Stats())
+		# report the arguments as they were actually used
+		row['game_args'] = driver.game.args
+		row['brain_args'] = driver.brain.args
+	except Exception, e:
+		traceback.print_exc(file=sys.stdout)
+		row['error'] = repr(e)
+	finally:
+		sys.stdout.close()
+		sys.stdout = stdout
+
+	return row
+
+
+def RunSweep(sweep, output, jobs=None, timelimit=None, logdir=None, profile=False, nodelimit=None):
+	profile = profile or nodelimit is not None
+	work = [(n, i, timelimit, nodelimit, logdir, profile) for n, i in enumerate(sweep)]
+	print 'Sweep:', len(work), 'runs on', jobs or multiprocessing.cpu_count(), 'processes'
+
+	pool = multiprocessing.Pool(jobs)
+	out = open(output, 'w')
+	print >>out, '\t'.join(columns)
+	start = time.time()
+	try:
+		for row in pool.imap(RunJob, work):
+			print >>out, FormatRow(row)
+			out.flush()
+			print 'Sweep: finished run {} of {} ({:.0f}s elapsed)'.format(row['id']+1, len(work), time.time() - start)
+	finally:
+		pool.terminate()
+		out.close()
+
+
+
+if __name__ == "__main__":
+	game_specs, brain_specs = ([], [])
+
+	# parse command line arguments
+	try:
+		opts, args = getopt.getopt(sys.argv[1:], "hg:b:j:t:n:o:l:pc:", ["help", "game=", "brain=", "jobs=", "time=",
+		                                                               "nodes=", "output=", "logdir=", "profile",
+		                                                               "column="])
+
+		for o,a in opts:
+			if o in ('-h', '--help'):
+				print usage()
+				sys.exit(0)
+			elif o in ('-g', '--game'):
+				game_specs.append(a)
+			elif o in ('-b', '--brain'):
+				brain_specs.append(a)
+			elif o in ('-j', '--jobs'):
+				jobs = int(a)
+			elif o in ('-t', '--time'):
+				timelimit = float(a)
+			elif o in ('-n', '--nodes'):
+				nodelimit = int(a)
+			elif o in ('-o', '--output'):
+				output = a
+			elif o in ('-l', '--logdir'):
+				logdir = a
+			elif o in ('-p', '--profile'):
+				profile = True
+			elif o in ('-c', '--column'):
+				columns.insert(columns.index('error'), a)
+	except getopt.GetoptError, err:
+		print str(err), usage()
+		sys.exit(2)
+
+	if not game_specs or not brain_specs:
+		print usage()
+		sys.exit(2)
+
+	if logdir is not None and not os.path.isdir(logdir):
+		os.makedirs(logdir)
+
+	sweep = list(ExpandSweep(game_specs, brain_specs))
+	if not CheckSweep(sweep):
+		sys.exit(2)
+
+	RunSweep(sweep, output, jobs, timelimit, logdir, profile, nodelimit)